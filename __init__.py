@@ -19,17 +19,58 @@ to all of Ebay's API's
 
 __author__ = ["Ben DeMott", "Wesley Hansen"]
 
-import httplib
-from lxml import etree
 import sys
 import os.path
-import uuid
 import traceback
-import simplejson
+import re
+import functools
+import threading
+import time
+import importlib
+
+
+class LazyModule():
+	'''
+	Stands in for a module that is only imported the first time one of its
+	attributes is used. The heavy modules( lxml, httplib, simplejson, uuid)
+	are loaded this way so importing ebay, and its api packages, stays cheap
+	for processes that never build a tree or open a connection.
+	'''
+	def __init__( self, name ):
+		self.__dict__['_name'] = name
+
+	def __getattr__( self, attribute ):
+		#Copy the module's attributes onto the proxy, so this is only called once
+		module = importlib.import_module( self._name )
+		self.__dict__.update( module.__dict__ )
+		return getattr( module, attribute )
+
+httplib = LazyModule( 'httplib' )
+etree = LazyModule( 'lxml.etree' )
+uuid = LazyModule( 'uuid' )
+simplejson = LazyModule( 'simplejson' )
+socket = LazyModule( 'socket' )
+select = LazyModule( 'select' )
+zlib = LazyModule( 'zlib' )
 
 class EbayApiRequest():
 	'''
 	Holds some information global to all Ebay Requests
+	
+	Thread safety:
+		-A request object belongs to one thread at a time. Don't call update(),
+		get_xml() or the set_* methods of the same request from several threads
+		at once, hand it over( to a worker, execute_many(), a dispatcher) once
+		it's been built.
+		-Separate request objects can be built and sent from any number of
+		threads at once. Every request has its own data and headers: the class
+		attributes are only defaults, the mutable ones( data, headers) are
+		copied to the instance before they are written to.
+		-The state shared between requests is either immutable once created
+		( the validation and serialization plans), written atomically( the
+		envelope cache) or locked( CredentialsCache, ConnectionPool).
+		-GlobalConfiguration is process-wide, configure it before starting the
+		threads that create requests.
 	'''
 	xml_header = '''<?xml version="1.0" encoding="UTF-8"?>'''
 	validated = False #<---True if data has been updated and validated, False otherwise
@@ -38,30 +79,66 @@ class EbayApiRequest():
 	site_id = 100 #Site ID for the eBay site you're using the EbayApiRequest for(default is 100[eBayMotors])
 
 	tree = None #<--- The root etree._Element created from _build()
-	data = {} #<---This is the container for all of the fields that will go into building the <Item> container
+	data = None #<---This is the container for all of the fields that will go into building the <Item> container
+	dirty_keys = None #<---Top-level keys of data updated since the tree was built, None if the tree must be rebuilt entirely
+	key_elements = None #<---Maps each top-level key of data to the elements of the tree it was built into
+	built_envelope = None #<---The envelope fields the tree was built with, see _get_envelope_fields()
+	data_version = 0 #<---Incremented every time update() changes data
+	serialized = None #<---Maps each (xml_declaration, pretty_print) format to the xml serialized for serialized_version
+	serialized_version = None #<---The data_version and envelope fields the serialized xml was made from
+	keep_tree = True #<---False to drop the tree once the request has been serialized by get_xml(), to save memory
 
 	def __init__(self):
 		'''
 		Initialize data structures, and set variable defaults
 		'''
-		self.tree = None
-		self.data = {}
-		self.validated = False
+		self.reset()
 		self.error_language = 'en_US'
 		self.warning_level = 'High'
 		self.site_id = 100
 		
 		
+	def reset(self):
+		'''
+		Clear the data of the request and everything built from it, so the
+		object can be reused for another request with the same configuration
+		'''
+		self.tree = None
+		self.data = {}
+		self.dirty_keys = None
+		self.key_elements = {}
+		self.built_envelope = None
+		self.data_version = 0
+		self.serialized = {}
+		self.serialized_version = None
+		self.validated = False
+		
 	def get_element(self):
 		'''
 		Retrieve the XML node of the assembled request
 		In order to retrieve an element, data must be updated and validated
+		
+		The tree is only built from scratch the first time, or when one of the
+		envelope fields changed. After that only the top-level keys that were
+		passed to update() since the last call are rebuilt, the rest of the
+		tree is reused.
 		'''
 		if not self.validated:
 			raise DataNotValidatedError( "Data Not Validated: Validate the data by calling update()" )
 			
-		#Build the xml request from the given data
-		self._build( self.data )
+		if self.tree is None or self.dirty_keys is None or self.built_envelope != self._get_envelope_fields():
+			#Build the xml request from the given data
+			self._build( self.data )
+		elif self.dirty_keys:
+			#Rebuild the parts of the request that were updated
+			self._validate_request( self.data )
+			try:
+				self._rebuild( self.dirty_keys )
+			except:
+				#The tree may be half rebuilt, build it from scratch next time
+				self.dirty_keys = None
+				raise
+		self.dirty_keys = set()
 		
 		#Return the xml node (etree._Element)
 		return self.tree
@@ -69,10 +146,19 @@ class EbayApiRequest():
 	def get_data(self):
 		'''
 		Returns the underlying data structure
+		
+		Use update() to change it, get_element() only rebuilds the keys that
+		were passed to update()
 		'''
 		return self.data
 	def generate_message_id(self):
-		return 
+		'''
+		Set the MessageID to a new random UUID( 32 hex characters) and return it.
+		eBay echoes it back as the CorrelationID, and ebay.retry keeps it across
+		the retries of a request.
+		'''
+		self.message_id = uuid.uuid4().hex
+		return self.message_id
 		
 	def get_message_id(self):
 		return self.message_id
@@ -108,23 +194,34 @@ class EbayApiRequest():
 		'''
 		self.warning_level = level
 		
-	def update(self, update):
+	def update(self, update, merge=False):
 		'''
 		Set request data - This is how you set data to form the request!
 		
 		The keys that you can set are indicated by calling the help() method
 		of this class
+		
+		Keys can be dotted to set a nested value, the dotted keys of an update
+		are resolved together in one pass:
+			{'shipping_details.shipping_type': 'Flat',
+			 'shipping_details.shipping_service_options.shipping_service_cost': 19.98}
+		
+		Args:
+			update[dict]: The data to set
+			merge[bool]: (Optional) True to merge nested dicts into the data that is
+			already set key by key, instead of replacing whole top-level values
 		'''
 		if isinstance( update, dict ):
-			#Update a dictionary into data
-		
 			#Resolve the dotted keys, dropping the dots and adding levels to the dictionary
-			#update = self._manage_dot_keys(update)
 			update = self._resolve_dottedkeys( update )
+			if merge:
+				update = self._merge_update( update )
 			
 			#Update the dictionary, overwriting values if the keys exist
-			for key,value in update.iteritems():
-				self.data.update( {key:value} )
+			self.data.update( update )
+			if self.dirty_keys is not None:
+				self.dirty_keys.update( update )
+			self.data_version += 1
 
 			exceptions = []
 			exception_keys = []
@@ -153,9 +250,31 @@ class EbayApiRequest():
 		else:
 			raise UpdateDataError( "Incorrect update parameters, must pass a dictionary")
 			
+	def _merge_update(self, update):
+		'''
+		Merge the nested dicts of update into the data that is already set.
+		Only the dicts along the merged paths are copied, so the dicts passed to
+		earlier updates are never modified.
+		'''
+		data = self.data
+		merged = {}
+		for key, value in update.iteritems():
+			current = data.get( key )
+			if isinstance( value, dict ) and isinstance( current, dict ):
+				merged[key] = merge_dicts( current, value )
+			else:
+				merged[key] = value
+		return merged
+
 	def _resolve_dottedkeys(self, data):
 		"""
 		Resolves dotted keys within a dictionary.
+		
+		The dotted keys are grouped into a KeyTrie by their common prefixes, then
+		the trie is merged into the plain keys in a single walk. A dotted key
+		that lands on a value that is already set turns it into a list:
+			{'a': {'b': 1}, 'a.b': 2} --> {'a': {'b': [1, 2]}}
+		The dicts passed in are never modified, the ones along the dotted paths are copied.
 	
 		Arguments:
 		- data (`dict`)
@@ -164,39 +283,18 @@ class EbayApiRequest():
 		Returns:
 		- The data (`dict`) with the dotted keys resolved.
 		"""
+		trie = None
+		for key, value in data.iteritems():
+			if '.' in key:
+				if trie is None:
+					trie = KeyTrie()
+				trie.insert( key, value )
+		if trie is None:
+			return data
 
-		# Find dotted keys.
-		dotted = dict((key, value) for key, value in data.iteritems() if '.' in key)
-	
-		# Remove dotted keys.
-		data = dict((key, value) for key, value in data.iteritems() if '.' not in key)
-	
-		# Resolve dotted keys.
-		for key, value in dotted.iteritems():
-			parts = key.split('.')
-			end = len(parts) - 1
-			sub = data
-			for i, part in enumerate(parts):
-				if i == end:
-					if part not in sub:
-						print "part not in sub"
-						sub[part] = value
-					elif isinstance(sub[part], list):
-						print "it's a list, appending"
-						sub[part].append(value)
-					else:
-						print "creating list"
-						sub[part] = [sub[part], value]
-				elif part in sub:
-					if isinstance(sub[part], dict):
-						sub = sub[part]
-					else:
-						raise ValueError("Cannot nest %r at %r because %r is %r." % (value, key, '.'.join(parts[:i+1]), sub[part]))
-				else:
-					sub[part] = {}
-					sub = sub[part]
-	
-		return data
+		resolved = dict( (key, value) for key, value in data.iteritems() if '.' not in key )
+		trie.merge_into( resolved, () )
+		return resolved
 
 	def _validate_request(self, data=None):
 		'''
@@ -208,59 +306,201 @@ class EbayApiRequest():
 		if not data:
 			data = self.data
 		
-		#Handle 'OR'd' keys i.e.: "postal_code|location"
-		#Split them into separate keys, and add to accepted_keys
-		#		ALSO
-		#Add keys to required, including the split keys
-		#separate keys into a list of or_pair sets for subset testing
-		accepted_keys = set() #A set of all acceptable keys
-		required = set() #A set of all required keys( or-pairs are split off
-		or_pairs = []#A list of all or-pair key sets
-		
-		#Populate accepted_keys, required, and or_pairs
-		for key in self.required_keys:
-			if "|" in key:
-				split_list = key.split( "|" )
-				or_pairs.append( set( split_list) )
-				for split_key in split_list:
-					accepted_keys.add(split_key)
-					required.add( split_key)			
-			else:
-				accepted_keys.add(key)
-				required.add( key )
+		plan = self.get_validation_plan()
 		
-		accepted_keys |= set(self.other_keys)
 		#Ensure that all keys used are acceptable
-		unacceptable = set( data.keys()) - set( accepted_keys)
+		accepted_keys = plan.accepted_keys
+		unacceptable = [key for key in data if key not in accepted_keys]
 		if len( unacceptable):
-			raise InvalidRequest( "These keys are not acceptable %s" % list( unacceptable ) )
+			raise InvalidRequest( "These keys are not acceptable %s" % unacceptable )
 
 		#Ensure all required keys are present
-		missing = required - set(data.keys())
-		key_pairs = []#<--A list of or-pair keys to add to missing
-		remove_pairs = []#<-- A list of keys to remove from missing
-		for pair in or_pairs:
-			if pair.issubset( missing ):
-				#Pair was not in self.data, add to missing
-				or_string = ""
-				for element in pair:
-					or_string += element + "|"
-				key_pairs.append( or_string.strip('|') )
-			
-			#Always remove the un-or'd elements from missing
-			for element in pair:
-				remove_pairs.append( element )
-
-		#Add or-pairs to missing that weren't included in data
-		for pair in key_pairs:
-			missing.add( pair )
-		#Remove or-pair keys from missing that were included in data
-		for key in remove_pairs:
-			missing.discard(key)
+		missing = [key for key in plan.required if key not in data]
+		#Or-pairs are missing when none of their keys are in data
+		for pair, or_string in plan.or_pairs:
+			if pair.isdisjoint( data ):
+				missing.append( or_string )
 			
 		if(len(missing)):
-			raise InvalidRequest("These required keys have not been set - %s" % list(missing))
+			raise InvalidRequest("These required keys have not been set - %s" % missing)
+		
+	def validate_many(self, rows):
+		'''
+		Validate a whole table of requests at once, without creating a request
+		object for every row. Each field is validated as a column: a
+		_validate_column_<key>( indexes, values ) method validates the whole
+		column in one pass, keys without one fall back to their _validate_<key>
+		method for every value.
+		
+		A value of None or '' counts as not set( empty csv cells for instance)
+		Dotted keys are resolved the same way update() resolves them.
+		
+		Args:
+			rows[iterable]: A list of dicts, a csv.DictReader, or a NumPy structured
+			array( its field names are used as the keys)
+			
+		Returns:
+			A dict mapping the index of each row that failed validation to a
+			dict of {key: exception}. Rows that passed are not included.
+		'''
+		columns = self._get_columns( rows )
+		row_count = columns.pop( None )
+		return self.validate_columns( columns, row_count )
+
+	def validate_columns(self, columns, row_count):
+		'''
+		Validate a table of requests that is already split into columns, see validate_many()
+		
+		Args:
+			columns[dict]: Maps each top-level key to a tuple of lists (row indexes, values)
+			holding the rows the key is set in
+			row_count[int]: The number of rows in the table
+			
+		Returns:
+			A dict mapping the index of each row that failed validation to a
+			dict of {key: exception}
+		'''
+		plan = self.get_validation_plan()
+		report = {}
+		
+		for key, (indexes, values) in columns.iteritems():
+			if key not in plan.accepted_keys:
+				for index in indexes:
+					report.setdefault( index, {} )[key] = InvalidRequest( "This key is not acceptable %s" % key )
+				continue
+				
+			column_validator = plan.column_validators.get( key )
+			if column_validator:
+				errors = column_validator( self, indexes, values )
+			else:
+				errors = {}
+				validator = plan.validators.get( key )
+				if validator:
+					for index, value in zip( indexes, values ):
+						try:
+							validator( self, value )
+						except Exception as e:
+							errors[index] = e
+			for index, error in errors.iteritems():
+				report.setdefault( index, {} )[key] = error
+		
+		#Ensure all required keys are present in every row
+		required = [(key, (key,)) for key in plan.required]
+		required.extend( (or_string, pair) for pair, or_string in plan.or_pairs )
+		for name, keys in required:
+			present = set()
+			for key in keys:
+				if key in columns:
+					present.update( columns[key][0] )
+			if len( present ) != row_count:
+				for index in xrange( row_count ):
+					if index not in present:
+						report.setdefault( index, {} )[name] = InvalidRequest( "This required key has not been set - %s" % name )
+		return report
+
+	def _get_columns(self, rows):
+		'''
+		Turn rows into columns for validate_many()
+		Returns a dict mapping each top-level key to a tuple of lists
+		(row indexes, values) holding the rows the key is set in, and None to
+		the number of rows
+		'''
+		columns = {}
+		field_names = getattr( getattr( rows, 'dtype', None ), 'names', None )
+		if field_names:
+			#NumPy structured array, the columns are already there
+			return self._get_array_columns( rows, field_names )
+		
+		row_count = 0
+		for index, row in enumerate( rows ):
+			row_count += 1
+			dotted = None
+			for key, value in row.iteritems():
+				if value is None or value == '':
+					continue
+				if '.' in key:
+					if dotted is None:
+						dotted = {}
+					dotted[key] = value
+					continue
+				column = columns.get( key )
+				if column is None:
+					column = columns[key] = ([], [])
+				column[0].append( index )
+				column[1].append( value )
+			if dotted:
+				for key, value in self._resolve_dottedkeys( dotted ).iteritems():
+					column = columns.get( key )
+					if column is None:
+						column = columns[key] = ([], [])
+					column[0].append( index )
+					column[1].append( value )
+		columns[None] = row_count
+		return columns
+
+	def _get_array_columns(self, rows, field_names):
+		'''
+		_get_columns() for a NumPy structured array, each field is taken as a whole
+		column. Only the dotted fields are resolved row by row.
+		'''
+		columns = {}
+		dotted_names = []
+		for name in field_names:
+			if '.' in name:
+				dotted_names.append( name )
+				continue
+			indexes = []
+			values = []
+			for index, value in enumerate( rows[name].tolist() ):
+				if value is None or value == '':
+					continue
+				indexes.append( index )
+				values.append( value )
+			if indexes:
+				columns[name] = (indexes, values)
+		
+		if dotted_names:
+			dotted_columns = [rows[name].tolist() for name in dotted_names]
+			for index, row in enumerate( zip( *dotted_columns ) ):
+				dotted = dict( (name, value) for name, value in zip( dotted_names, row ) if value is not None and value != '' )
+				if not dotted:
+					continue
+				for key, value in self._resolve_dottedkeys( dotted ).iteritems():
+					column = columns.get( key )
+					if column is None:
+						column = columns[key] = ([], [])
+					column[0].append( index )
+					column[1].append( value )
+		columns[None] = len( rows )
+		return columns
+
+	def _validate_column_choices(self, indexes, values, choices, error):
+		'''
+		Validate a column whose values must be one of choices.
+		The column's distinct values are checked against choices once, then only
+		the rows holding an unacceptable value are reported.
 		
+		Args:
+			indexes[list]: The row index of each value
+			values[list]: The values of the column
+			choices[tuple]: The acceptable values
+			error[Exception]: The exception class to report unacceptable values with
+			
+		Returns:
+			A dict of {row index: exception}
+		'''
+		try:
+			unacceptable = set( values ).difference( choices )
+		except TypeError:
+			#Unhashable values, check them one at a time
+			unacceptable = [value for value in values if value not in choices]
+		errors = {}
+		if unacceptable:
+			for index, value in zip( indexes, values ):
+				if value in unacceptable:
+					errors[index] = error( "%r is not acceptable, must be one of: %s" % (value, list( choices )) )
+		return errors
+
 	def _validate(self, key, val):
 		'''
 		Validate the data structure of a top-level key
@@ -268,13 +508,11 @@ class EbayApiRequest():
 		This validates the structure by each top-level key.
 		'''
 		
-		accepted_keys = set(self.other_keys) | set(self.required_keys)
-		if key in accepted_keys:
-			fn = getattr(self, '_validate_'+key, None)
-			if(not fn):
-				return
+		fn = self.get_validation_plan().validators.get(key)
+		if(not fn):
+			return
 		
-			return fn(val)
+		return fn(self, val)
 		
 		
 	def _build(self, data):
@@ -288,25 +526,18 @@ class EbayApiRequest():
 		'''
 		
 		self._validate_request( data )
+		self._validate_envelope()
 		#Create the root of the request with the given namespace
 		root = etree.Element( "{%s}%s" % (self.namespace, self.request_name ), nsmap={None: self.namespace} )
 		
 		#Build other additional things:
 		#ErrorLanguage
-		if self.error_language:
-			error = etree.SubElement( root, "ErrorLanguage")
-			error.text = self.error_language
-		else:
-			#ErrorLanguage is required, so raise exception
-			raise InvalidTopLevelRequest( "InvalidTopLevelRequest: Must include an Error Language" )
+		error = etree.SubElement( root, "ErrorLanguage")
+		error.text = self.error_language
 		
 		#WarningLevel
-		if self.warning_level:
-			warning = etree.SubElement( root, "WarningLevel" )
-			warning.text = self.warning_level
-		else:
-			#WarningLevel is required so raise exception
-			raise InvalidTopLevelRequest( "InvalidTopLevelRequest: Must include a Warning Level" )
+		warning = etree.SubElement( root, "WarningLevel" )
+		warning.text = self.warning_level
 
 		#MessageID
 		if self.message_id:
@@ -314,12 +545,8 @@ class EbayApiRequest():
 			message.text = self.message_id
 		
 		#Version
-		if self.api_version:
-			version = etree.SubElement( root, "Version" )
-			version.text = str(self.api_version)
-		else:
-			#Version is required so raise an exception
-			raise InvalidTopLevelRequest( "InvalidTopLevelRequest: Must include a Version" )
+		version = etree.SubElement( root, "Version" )
+		version.text = str(self.api_version)
 
 		#RequestCredentials
 		if self.token:
@@ -329,11 +556,17 @@ class EbayApiRequest():
 
 		#Build Item element
 		if isinstance( data, dict ):
+			plan = self.get_serialization_plan()
 			if self.call_name in self.has_item_container:
-				item = etree.SubElement( root, "Item" )
-				self._build_item_container( item, data )
+				container = etree.SubElement( root, "Item" )
 			else:
-				self._build_item_container( root, data )
+				container = root
+			#Build each top-level key on its own, remembering which elements it created
+			key_elements = {}
+			for key, value in data.iteritems():
+				start = len( container )
+				plan.build_value( container, key, value )
+				key_elements[key] = container[start:]
 		else:
 			#Must have an item to build, raise exception
 			raise InvalidRequestData( "InvalidRequestData: Data must be a dict, not a: %r" % data )
@@ -341,7 +574,188 @@ class EbayApiRequest():
 		#print etree.tostring( root, pretty_print = True )
 		#Set the tree to root--This will be returned by a call to get_element()
 		self.tree = root
+		self.key_elements = key_elements
+		self.built_envelope = self._get_envelope_fields()
+
+	def _rebuild(self, keys):
+		'''
+		Rebuild the elements of the given top-level keys in self.tree, putting
+		the new elements where the old ones were
+		
+		Args:
+			keys[iterable]: The top-level keys of self.data to rebuild
+		'''
+		plan = self.get_serialization_plan()
+		if self.call_name in self.has_item_container:
+			container = self.tree.find( "Item" )
+		else:
+			container = self.tree
+		for key in keys:
+			old_elements = self.key_elements.get( key )
+			if old_elements:
+				position = container.index( old_elements[0] )
+				for element in old_elements:
+					container.remove( element )
+			else:
+				position = len( container )
+			
+			#Build the key on a scratch element, then move the new elements into the tree
+			scratch = etree.Element( "Scratch" )
+			plan.build_value( scratch, key, self.data[key] )
+			new_elements = scratch[:]
+			for offset, element in enumerate( new_elements ):
+				container.insert( position + offset, element )
+			self.key_elements[key] = new_elements
+
+	def _get_envelope_fields(self):
+		'''
+		Returns the values of the fields the envelope of the request is built from
+		'''
+		return (self.request_name, self.error_language, self.warning_level,
+				self.message_id, self.api_version, self.token)
+			
+	def _validate_envelope(self):
+		'''
+		Check that the fields wrapped around the request data( ErrorLanguage,
+		WarningLevel and Version) are set, they are required for every request
+		'''
+		if not self.error_language:
+			raise InvalidTopLevelRequest( "InvalidTopLevelRequest: Must include an Error Language" )
+		if not self.warning_level:
+			raise InvalidTopLevelRequest( "InvalidTopLevelRequest: Must include a Warning Level" )
+		if not self.api_version:
+			raise InvalidTopLevelRequest( "InvalidTopLevelRequest: Must include a Version" )
+
+	def serialize(self, sink=None, xml_declaration=False):
+		'''
+		Serialize the request straight to xml bytes( UTF-8) without building
+		the etree first. The output is the same xml that get_element() would
+		build, encoded as UTF-8
+		
+		Args:
+			sink[file]: (Optional) A file-like object the xml is written to, anything
+			with a write() method will do( a file, a socket file, a StringIO...)
+			xml_declaration[bool]: (Optional) True to start with an <?xml?> declaration
+			
+		Returns:
+			The xml string if no sink was given, None otherwise
+		'''
+		if not self.validated:
+			raise DataNotValidatedError( "Data Not Validated: Validate the data by calling update()" )
+		
+		data = self.data
+		if not isinstance( data, dict ):
+			raise InvalidRequestData( "InvalidRequestData: Data must be a dict, not a: %r" % data )
+		self._validate_request( data )
+		self._validate_envelope()
+
+		if sink is None:
+			parts = []
+			write = parts.append
+		else:
+			write = sink.write
 			
+		if xml_declaration:
+			write( "<?xml version='1.0' encoding='UTF-8'?>\n" )
+		head, tail, foot = self._get_envelope()
+		write( head )
+		if self.message_id:
+			write( '<MessageID>%s</MessageID>' % escape_text( self.message_id ) )
+			write( tail )
+		
+		plan = self.get_serialization_plan()
+		if self.call_name in self.has_item_container:
+			if data:
+				write( '<Item>' )
+				plan.write( write, data )
+				write( '</Item>' )
+			else:
+				write( '<Item/>' )
+		else:
+			plan.write( write, data )
+		write( foot )
+		
+		if sink is None:
+			return ''.join( parts )
+
+	def get_xml(self, xml_declaration=False, pretty_print=False):
+		'''
+		Returns the xml string of the request.
+		
+		The xml is cached for each format until update() is called or one of the
+		envelope fields changes, so a request that is logged, sent and appended
+		to a BulkDataFile is only serialized once. Compact xml is serialized
+		straight from data, pretty printed xml is made from get_element().
+		If keep_tree is False, the tree is dropped afterwards.
+		
+		Args:
+			xml_declaration[bool]: (Optional) True to start with an <?xml?> declaration
+			pretty_print[bool]: (Optional) True to indent the xml
+		'''
+		version = (self.data_version, self._get_envelope_fields())
+		if self.serialized_version != version:
+			self.serialized = {}
+			self.serialized_version = version
+		
+		xml_format = (xml_declaration, pretty_print)
+		xml = self.serialized.get( xml_format )
+		if xml is None:
+			if pretty_print:
+				xml = etree.tostring( self.get_element(), pretty_print=True, xml_declaration=xml_declaration, encoding='UTF-8' )
+			else:
+				xml = self.serialize( xml_declaration=xml_declaration )
+			self.serialized[xml_format] = xml
+			
+			if not self.keep_tree and self.tree is not None:
+				self.tree = None
+				self.key_elements = {}
+				self.dirty_keys = None
+		return xml
+
+	def _get_envelope(self):
+		'''
+		Returns the serialized xml wrapped around the request data as a tuple
+		of strings (head, tail, foot):
+			head: The root start tag and the fields that come before <MessageID>,
+			followed by tail if the request has no MessageID
+			tail: The fields that come after <MessageID>
+			foot: The root end tag
+		'''
+		head = '<%s xmlns="%s"><ErrorLanguage>%s</ErrorLanguage><WarningLevel>%s</WarningLevel>' % (
+			self.request_name, self.namespace, escape_text( self.error_language ), escape_text( self.warning_level ) )
+		tail = '<Version>%s</Version>' % escape_text( str( self.api_version ) )
+		if self.token:
+			tail += '<RequesterCredentials><eBayAuthToken>%s</eBayAuthToken></RequesterCredentials>' % escape_text( self.token )
+		foot = '</%s>' % self.request_name
+		if self.message_id:
+			return (head, tail, foot)
+		return (head + tail, '', foot)
+
+	@classmethod
+	def get_validation_plan(cls):
+		'''
+		Returns the ValidationPlan compiled for this request class.
+		Like the SerializationPlan, it is compiled once and stored on the class.
+		'''
+		plan = cls.__dict__.get( '_validation_plan' )
+		if plan is None:
+			plan = ValidationPlan( cls )
+			cls._validation_plan = plan
+		return plan
+
+	@classmethod
+	def get_serialization_plan(cls):
+		'''
+		Returns the SerializationPlan compiled for this request class.
+		The plan is compiled the first time it is asked for and then stored
+		on the class itself, so every instance of the class shares it.
+		'''
+		plan = cls.__dict__.get( '_serialization_plan' )
+		if plan is None:
+			plan = SerializationPlan( cls )
+			cls._serialization_plan = plan
+		return plan
+
 	def _build_item_container( self, element, data, key=None):
 		'''
 		Parses the given data, creating an element out of each key:value
@@ -460,10 +874,747 @@ class EbayApiRequest():
 	  <!-- Call-specific Input Fields -->
 	  <Item> ItemType
 		'''
-		if self.tree is None:
+		if not self.validated:
 			return ''
 		else:
-			return etree.tostring( self.tree, pretty_print=False )
+			return self.get_xml()
+
+
+class ValidationPlan():
+	'''
+	The key sets and validators of a request class, compiled once per class
+	from its required_keys, other_keys and _validate_<key> methods so that
+	_validate_request() and _validate() don't rebuild them for every call.
+	'''
+
+	def __init__( self, request_class ):
+		'''
+		Args:
+			request_class[class]: The EbayApiRequest subclass this plan is compiled for
+		'''
+		self.request_class = request_class
+		
+		#Handle 'OR'd' keys i.e.: "postal_code|location"
+		#Split them into separate keys, and add them to accepted_keys
+		#Keep each pair as a set along with its original string for error messages
+		accepted_keys = set( getattr( request_class, 'other_keys', () ) )
+		required = set()
+		or_pairs = []
+		for key in getattr( request_class, 'required_keys', () ):
+			if "|" in key:
+				pair = frozenset( key.split( "|" ) )
+				or_pairs.append( (pair, key) )
+				accepted_keys |= pair
+			else:
+				accepted_keys.add( key )
+				required.add( key )
+		
+		self.accepted_keys = frozenset( accepted_keys ) #All of the acceptable top-level keys
+		self.required = frozenset( required ) #Required keys that aren't part of an or-pair
+		self.or_pairs = tuple( or_pairs ) #(set of keys, "key|key") for each or-pair, at least one key of each pair is required
+		
+		#Map each acceptable key to the function of its _validate_<key> method
+		#and the function of its _validate_column_<key> method( see validate_many())
+		self.validators = {}
+		self.column_validators = {}
+		for key in self.accepted_keys:
+			method = getattr( request_class, '_validate_' + key, None )
+			if method is not None:
+				self.validators[key] = getattr( method, 'im_func', method )
+			method = getattr( request_class, '_validate_column_' + key, None )
+			if method is not None:
+				self.column_validators[key] = getattr( method, 'im_func', method )
+
+
+class SerializationPlan():
+	'''
+	A serialization plan compiled once per request class from its key_map.
+	
+	_build_item_container() looks up the key_map and walks an isinstance chain
+	for every node it creates. The plan resolves the xml tag of every key up
+	front and classifies values with a single dictionary lookup on their type,
+	so building a request only does the work that depends on the data itself.
+	The elements it creates are identical to the ones _build_item_container()
+	creates.
+	'''
+	TEXT = 0 #Value is written as the text of an element as-is
+	NUMBER = 1 #Value is converted with str() and written as the text of an element
+	LIST = 2 #Each item of the value creates a sibling element with the same tag
+	CONTAINER = 3 #Value is a dict creating the children of a new element
+
+	value_kinds = {
+		str: TEXT,
+		unicode: TEXT,
+		int: NUMBER,
+		bool: NUMBER,
+		float: NUMBER,
+		list: LIST,
+		dict: CONTAINER,
+	}#Maps the exact type of a value to the way it is serialized
+
+	def __init__( self, request_class ):
+		'''
+		Args:
+			request_class[class]: The EbayApiRequest subclass this plan is compiled for
+		'''
+		self.request_class = request_class
+		self.tags = dict( getattr( request_class, 'key_map', {} ) )
+		self.kinds = dict( self.value_kinds )
+		
+		#Pre-formatted tags used by write()
+		self.start_tags = dict( (key, '<%s>' % tag) for key, tag in self.tags.iteritems() )
+		self.end_tags = dict( (key, '</%s>' % tag) for key, tag in self.tags.iteritems() )
+		self.empty_tags = dict( (key, '<%s/>' % tag) for key, tag in self.tags.iteritems() )
+
+	def build_value( self, element, key, value ):
+		'''
+		Create the element(s) of a single key:value pair and append them to element
+		
+		Args:
+			element[etree._Element]: The element to append the new elements to
+			key[str]: A key of the key_map
+			value: The value of the key( a string, a number, a list or a dict)
+		'''
+		self._build_children( element, {key: value} )
+
+	def _kind_of( self, value ):
+		'''
+		Classify a value whose type isn't in the kinds table( subclasses of the
+		supported types) and remember the answer for that type
+		'''
+		if isinstance( value, basestring ):
+			kind = self.TEXT
+		elif isinstance( value, (int, float) ):
+			kind = self.NUMBER
+		elif isinstance( value, list ):
+			kind = self.LIST
+		elif isinstance( value, dict ):
+			kind = self.CONTAINER
+		else:
+			raise InvalidDataType( "InvalidDataType: a value can be a string, a float, an int, a list, or a dict...not a %r" % value )
+		self.kinds[value.__class__] = kind
+		return kind
+
+	def build( self, element, data ):
+		'''
+		Create an element for each key:value pair of data and append it to element
+		
+		Args:
+			element[etree._Element]: The element to append the new elements to
+			data[dict]: Elements are created such that key is an xml tag, and value is the text field
+		'''
+		if not isinstance( element, etree._Element ):
+			raise InvalidElementError( "InvalidElementError: element must be a valid etree._Element, instead element is %r" % element )
+		if not isinstance( data, dict ):
+			raise InvalidDataType( "InvalidDataType: a value can be a string, a float, an int, a list, or a dict...not a %r" % data )
+		self._build_children( element, data )
+
+	def _build_children( self, element, data ):
+		SubElement = etree.SubElement
+		tags = self.tags
+		kinds = self.kinds
+		for key, value in data.iteritems():
+			tag = tags[key]
+			kind = kinds.get( value.__class__ )
+			if kind is None:
+				kind = self._kind_of( value )
+			if kind == self.TEXT:
+				SubElement( element, tag ).text = value
+			elif kind == self.NUMBER:
+				SubElement( element, tag ).text = str( value )
+			elif kind == self.LIST:
+				self._build_list( element, tag, value )
+			else:
+				self._build_children( SubElement( element, tag ), value )
+
+	def _build_list( self, element, tag, values ):
+		SubElement = etree.SubElement
+		kinds = self.kinds
+		for value in values:
+			kind = kinds.get( value.__class__ )
+			if kind is None:
+				kind = self._kind_of( value )
+			if kind == self.TEXT:
+				SubElement( element, tag ).text = value
+			elif kind == self.NUMBER:
+				SubElement( element, tag ).text = str( value )
+			elif kind == self.LIST:
+				self._build_list( element, tag, value )
+			else:
+				self._build_children( SubElement( element, tag ), value )
+
+	def write( self, write, data ):
+		'''
+		Write the serialized xml of each key:value pair of data, producing the same
+		bytes as build() followed by etree.tostring() would. The one difference is
+		that non-ASCII UTF-8 str values are written as-is where etree refuses them,
+		str values that aren't UTF-8 raise InvalidDataType either way.
+		
+		Args:
+			write[function]: Called with each chunk of xml( the write method of a file-like object for instance)
+			data[dict]: Elements are created such that key is an xml tag, and value is the text field
+		'''
+		if not isinstance( data, dict ):
+			raise InvalidDataType( "InvalidDataType: a value can be a string, a float, an int, a list, or a dict...not a %r" % data )
+		self._write_children( write, data )
+
+	def _write_children( self, write, data ):
+		kinds = self.kinds
+		start_tags = self.start_tags
+		end_tags = self.end_tags
+		for key, value in data.iteritems():
+			start = start_tags[key]
+			kind = kinds.get( value.__class__ )
+			if kind is None:
+				kind = self._kind_of( value )
+			if kind == self.TEXT:
+				write( start + escape_text( value ) + end_tags[key] )
+			elif kind == self.NUMBER:
+				write( start + str( value ) + end_tags[key] )
+			elif kind == self.LIST:
+				self._write_list( write, key, value )
+			elif value:
+				write( start )
+				self._write_children( write, value )
+				write( end_tags[key] )
+			else:
+				write( self.empty_tags[key] )
+
+	def _write_list( self, write, key, values ):
+		kinds = self.kinds
+		start = self.start_tags[key]
+		end = self.end_tags[key]
+		for value in values:
+			kind = kinds.get( value.__class__ )
+			if kind is None:
+				kind = self._kind_of( value )
+			if kind == self.TEXT:
+				write( start + escape_text( value ) + end )
+			elif kind == self.NUMBER:
+				write( start + str( value ) + end )
+			elif kind == self.LIST:
+				self._write_list( write, key, value )
+			elif value:
+				write( start )
+				self._write_children( write, value )
+				write( end )
+			else:
+				write( self.empty_tags[key] )
+
+
+invalid_xml_characters = re.compile( '[\x00-\x08\x0b\x0c\x0e-\x1f]' ) #Control characters that are not allowed in xml text
+non_ascii_characters = re.compile( '[\x80-\xff]' )
+
+def escape_text( text ):
+	'''
+	Escape a string for use as the text of an xml element and encode it to UTF-8
+	Characters are escaped the same way libxml2 escapes them for etree.tostring()
+	
+	A str must already be UTF-8 encoded, etree refuses any str that isn't ASCII
+	and writing other bytes into the body would break its encoding="UTF-8"
+	'''
+	if text.__class__ is unicode:
+		text = text.encode( 'utf-8' )
+	elif non_ascii_characters.search( text ):
+		try:
+			text.decode( 'utf-8' )
+		except UnicodeDecodeError:
+			raise InvalidDataType( "InvalidDataType: strings must be unicode or UTF-8 encoded: %r" % text )
+	if invalid_xml_characters.search( text ):
+		raise InvalidDataType( "InvalidDataType: strings can not contain NULL bytes or control characters: %r" % text )
+	if '&' in text:
+		text = text.replace( '&', '&amp;' )
+	if '<' in text:
+		text = text.replace( '<', '&lt;' )
+	if '>' in text:
+		text = text.replace( '>', '&gt;' )
+	if '\r' in text:
+		text = text.replace( '\r', '&#13;' )
+	return text
+
+
+def compress_body( body ):
+	'''
+	Returns body compressed with gzip, for a request sent with Content-Encoding: gzip
+	'''
+	compressor = zlib.compressobj( 6, zlib.DEFLATED, 16 + zlib.MAX_WBITS )
+	return compressor.compress( body ) + compressor.flush()
+
+
+class Decompressor():
+	'''
+	Decodes a gzip or deflate response body piece by piece, as it arrives
+	'''
+	encodings = ('gzip', 'x-gzip', 'deflate')
+	
+	def __init__( self, encoding ):
+		self.deflate = encoding == 'deflate'
+		if self.deflate:
+			self.decoder = zlib.decompressobj( zlib.MAX_WBITS )
+		else:
+			self.decoder = zlib.decompressobj( 16 + zlib.MAX_WBITS )
+		self.started = False
+		
+	def decompress( self, data ):
+		if not data:
+			return ''
+		try:
+			decoded = self.decoder.decompress( data )
+		except zlib.error:
+			if not self.deflate or self.started:
+				raise
+			#Some servers send deflate without its zlib header
+			self.decoder = zlib.decompressobj( -zlib.MAX_WBITS )
+			decoded = self.decoder.decompress( data )
+		self.started = True
+		return decoded
+		
+	def flush( self ):
+		return self.decoder.flush()
+
+
+class DecodedResponse():
+	'''
+	Wraps an httplib.HTTPResponse, decompressing its body as it's read when
+	the server sent it gzip or deflate encoded. read( amt) streams, so the
+	response can be handed straight to a parser( etree.parse, iterparse)
+	without holding the compressed and decompressed bodies in memory.
+	Everything else( status, getheader(), isclosed()...) is the response's.
+	
+	on_close( reusable) is called once: with True when the whole body has
+	been read, with False when the response is closed( or dropped) before
+	that. EbayAPIConnection hands its pooled connection back to the pool with
+	it, so a response that's never read doesn't keep the connection.
+	'''
+	chunk_size = 65536
+	
+	def __init__( self, response, on_close=None ):
+		self.response = response
+		self.on_close = on_close
+		self.status = response.status
+		self.reason = response.reason
+		encoding = (response.getheader( 'content-encoding' ) or '').strip().lower()
+		self.decompressor = None
+		if encoding in Decompressor.encodings:
+			self.decompressor = Decompressor( encoding )
+		self.buffer = ''
+		self.finished = False
+		
+	def read( self, amt=None ):
+		data = self._read( amt )
+		if self.on_close is not None and self.response.isclosed():
+			self._call_on_close( True )
+		return data
+		
+	def close( self ):
+		'''
+		Close the response, its connection is only reused if the body was read completely
+		'''
+		reusable = self.response.isclosed()
+		self.response.close()
+		self._call_on_close( reusable )
+		
+	def __del__( self ):
+		if self.__dict__.get( 'on_close' ) is not None:
+			self.close()
+		
+	def _call_on_close( self, reusable ):
+		on_close, self.on_close = self.on_close, None
+		if on_close is not None:
+			on_close( reusable )
+		
+	def _read( self, amt ):
+		if self.decompressor is None:
+			if amt is None:
+				return self.response.read()
+			return self.response.read( amt )
+		if amt is None:
+			data = self.buffer + self.decompressor.decompress( self.response.read() )
+			self.buffer = ''
+			if not self.finished:
+				data += self.decompressor.flush()
+				self.finished = True
+			return data
+		while len( self.buffer ) < amt and not self.finished:
+			chunk = self.response.read( self.chunk_size )
+			if chunk:
+				self.buffer += self.decompressor.decompress( chunk )
+			else:
+				self.buffer += self.decompressor.flush()
+				self.finished = True
+		data, self.buffer = self.buffer[:amt], self.buffer[amt:]
+		return data
+		
+	def __getattr__( self, name ):
+		return getattr( self.response, name )
+
+
+class CredentialsCache():
+	'''
+	Process-wide cache of the api_credentials.json structure.
+	
+	The file is only parsed the first time it is needed, and again when its
+	modification time changes. The url, location and extra headers resolved
+	for each (api, environment) are cached along with it.
+	
+	The path of the file comes from the EBAY_API_CREDENTIALS environment
+	variable, or CredentialsCache.filename. Values can be overridden without
+	touching the file with set_overrides().
+	'''
+	filename = os.environ.get( 'EBAY_API_CREDENTIALS', "/home/wes/it/Development/projects/python/ebay/api_tests/LMS_API/bulk_api_layout/api_credentials.json" )#TODO: THIS MUST BE CONFIGURED ON INSTALL
+	check_interval = 1.0#Minimum number of seconds between checks of the file's modification time
+	
+	overrides = {}#Merged over the structure read from the file, see set_overrides()
+	files = {}#Maps each filename to a dict of its cached credentials (see _load())
+	lock = threading.Lock()
+	
+	@classmethod
+	def set_overrides( cls, overrides ):
+		'''
+		Set values that take precedence over the ones in the credentials file.
+		overrides has the same structure as the file and is merged over it key by key:
+			CredentialsCache.set_overrides( {'_keys': {'sandbox': {'auth_token': token}}} )
+		'''
+		with cls.lock:
+			cls.overrides = overrides
+			cls.files = {}
+	
+	@classmethod
+	def clear( cls ):
+		'''
+		Forget everything that has been read, the file is parsed again on next use
+		'''
+		with cls.lock:
+			cls.files = {}
+	
+	@classmethod
+	def get_credentials( cls, filename=None ):
+		'''
+		Returns the credentials structure of filename( CredentialsCache.filename by default)
+		with the overrides merged in. The structure is shared, do not modify it.
+		'''
+		return cls._load( filename )['credentials']
+	
+	@classmethod
+	def get_connection_info( cls, api, environment, filename=None ):
+		'''
+		Returns a tuple (url, location, headers) for the given api in the given environment,
+		where headers is a new dict of the extra headers the api needs
+		
+		Args:
+			api[string]: the name of the eBay API being connected to
+			environment[string]: Which environment the API is connecting to
+			filename[string]: (Optional) The path of the credentials file
+		'''
+		cached = cls._load( filename )
+		info = cached['connections'].get( (api, environment) )
+		if info is None:
+			info = cls._resolve( cached['credentials'], api, environment )
+			cached['connections'][(api, environment)] = info
+		url, location, headers = info
+		return url, location, dict( headers )
+	
+	@classmethod
+	def get_token( cls, environment, filename=None ):
+		'''
+		Returns the auth token of the given environment
+		'''
+		return cls.get_credentials( filename )['_keys'][environment]['auth_token']
+	
+	@classmethod
+	def _load( cls, filename ):
+		if filename is None:
+			filename = cls.filename
+		now = time.time()
+		cached = cls.files.get( filename )
+		if cached is not None and now - cached['checked'] < cls.check_interval:
+			return cached
+		
+		with cls.lock:
+			cached = cls.files.get( filename )
+			mtime = os.path.getmtime( filename )
+			if cached is None or cached['mtime'] != mtime:
+				fp = open( filename, mode='r' )
+				try:
+					credentials = simplejson.load( fp )
+				finally:
+					fp.close()
+				cached = {
+					'mtime': mtime,
+					'credentials': merge_dicts( credentials, cls.overrides ),
+					'connections': {},
+				}
+				cls.files = dict( cls.files )
+				cls.files[filename] = cached
+			cached['checked'] = now
+			return cached
+	
+	@classmethod
+	def _resolve( cls, credentials, api, environment ):
+		'''
+		Grab the url, location and extra headers of api in environment from the credentials structure
+		'''
+		#Check that api is valid
+		if api not in credentials.keys():
+			raise InvalidAPIError( "Invalid API specified\nAcceptable APIs are: %s" % [key for key in credentials.keys() if key is not '_keys'])
+
+		#Grab the url and location from credentials struct		
+		url = credentials[api].get(environment, {}).get("url", None )
+		location = credentials[api].get(environment, {}).get('location', None )
+		
+		if not url:
+			raise InvalidCredentialsError( "InvalidCredentialsError: URL invalid")
+		if not location:
+			raise InvalidCredentialsError( "InvalidCredentialsError: Location invalid" )
+		
+		#Grab the correct header information
+		keys = credentials.get( '_keys', None )
+		if not keys:
+			raise InvalidCredentialsError( "InvalidCredentialsError: '_keys' is missing" )
+		
+		extra_headers = credentials[api].get('_extra_headers', None )
+		if not extra_headers:
+			raise InvalidCredentialsError( "InvalidCredentialsError: _extra_headers is missing")
+		headers = {}
+		for key,value in extra_headers.iteritems():
+			headers[key] = keys[environment][value]
+		return (url, location, headers)
+
+
+def merge_dicts( base, overrides ):
+	'''
+	Returns a copy of base with overrides merged into it, nested dicts are merged key by key
+	'''
+	merged = dict( base )
+	for key, value in overrides.iteritems():
+		if isinstance( value, dict ) and isinstance( merged.get( key ), dict ):
+			merged[key] = merge_dicts( merged[key], value )
+		else:
+			merged[key] = value
+	return merged
+
+
+class KeyTrie():
+	'''
+	Dotted keys grouped by their common prefixes, see EbayApiRequest._resolve_dottedkeys()
+	'''
+	unset = object()#The value of a path that has no value of its own
+
+	def __init__( self ):
+		self.children = {}
+		self.value = self.unset
+
+	def insert( self, key, value ):
+		node = self
+		for part in key.split( '.' ):
+			child = node.children.get( part )
+			if child is None:
+				child = node.children[part] = KeyTrie()
+			node = child
+		node.value = value
+
+	def merge_into( self, target, path ):
+		'''
+		Merge the values under this node into the dict target, which is owned
+		by the caller and can be modified. path is the tuple of parts leading
+		to target, used in error messages.
+		'''
+		for part, node in self.children.iteritems():
+			if node.value is not node.unset:
+				if node.children:
+					raise ValueError( "Cannot nest keys under %r because it is set to %r." % ('.'.join( path + (part,) ), node.value) )
+				if part not in target:
+					target[part] = node.value
+				elif isinstance( target[part], list ):
+					target[part] = target[part] + [node.value]
+				else:
+					target[part] = [target[part], node.value]
+			else:
+				current = target.get( part )
+				if current is None:
+					sub = target[part] = {}
+				elif isinstance( current, dict ):
+					sub = target[part] = dict( current )
+				else:
+					raise ValueError( "Cannot nest keys under %r because it is %r." % ('.'.join( path + (part,) ), current) )
+				node.merge_into( sub, path + (part,) )
+
+
+class ConnectionPool():
+	'''
+	Keeps the connections to eBay's servers open between requests( HTTP
+	keep-alive), so requests don't pay the TCP and TLS handshakes every time.
+	
+	Connections are kept per (scheme, host, port). A connection is checked out
+	with get_connection() and handed back with release() once its response
+	has been read. At most max_per_host connections are open to a host, when
+	they're all checked out get_connection() waits up to wait_timeout seconds
+	for one to be released.
+	
+	EbayAPIConnection only checks a connection out in send_request(), and
+	hands it back as soon as the body of the response has been read( or the
+	request failed), so a connection is only held while a request is in flight.
+	
+	Idle connections are closed after idle_timeout seconds, and an idle
+	connection the server has closed is detected and replaced when it's
+	checked out. The pool is safe to share between threads.
+	'''
+	max_per_host = 8#Most connections open to one host at a time
+	idle_timeout = 50.0#Seconds an idle connection is kept, eBay's servers drop them after about a minute
+	timeout = 30#Socket timeout of the connections
+	wait_timeout = 60.0#Seconds get_connection() waits for a connection to be released before PoolTimeoutError is raised, None to wait forever
+	
+	def __init__( self, max_per_host=None, idle_timeout=None, timeout=None, wait_timeout=None ):
+		'''
+		Args:
+			All optional, they default to the class attributes of the same name
+		'''
+		if max_per_host is not None:
+			self.max_per_host = max_per_host
+		if idle_timeout is not None:
+			self.idle_timeout = idle_timeout
+		if timeout is not None:
+			self.timeout = timeout
+		if wait_timeout is not None:
+			self.wait_timeout = wait_timeout
+		self.condition = threading.Condition()
+		self.idle = {}#Maps each (scheme, host, port) to a list of (connection, time it was released)
+		self.counts = {}#Number of open connections to each (scheme, host, port), idle or checked out
+		
+	def get_connection( self, url ):
+		'''
+		Check out a connection to the host of url, opening a new one if none are idle
+		
+		Args:
+			url[str]: The url of the server( https://api.ebay.com)
+			
+		Returns:
+			An httplib connection, its reused attribute is True if it has already sent requests
+		'''
+		key = self.split_url( url )
+		deadline = None
+		if self.wait_timeout is not None:
+			deadline = time.time() + self.wait_timeout
+		with self.condition:
+			while True:
+				self._evict()
+				connection = self._take_idle( key )
+				if connection is not None:
+					connection.reused = True
+					return connection
+				if self.counts.get( key, 0 ) < self.max_per_host:
+					self.counts[key] = self.counts.get( key, 0 ) + 1
+					break
+				if deadline is None:
+					self.condition.wait()
+				else:
+					remaining = deadline - time.time()
+					if remaining <= 0:
+						raise PoolTimeoutError( "No connection to %s:%s was released within %s seconds" % (key[1], key[2], self.wait_timeout) )
+					self.condition.wait( remaining )
+		try:
+			connection = self._create( key )
+		except:
+			self._discard( key )
+			raise
+		connection.reused = False
+		return connection
+		
+	def release( self, connection, reusable=True ):
+		'''
+		Hand a connection back to the pool
+		
+		Args:
+			connection: A connection checked out with get_connection()
+			reusable[bool]: (Optional) False to close the connection instead of keeping it,
+			for connections whose response wasn't read completely or that raised an error
+		'''
+		if not reusable:
+			connection.close()
+			self._discard( connection.pool_key )
+			return
+		with self.condition:
+			self.idle.setdefault( connection.pool_key, [] ).append( (connection, time.time()) )
+			self.condition.notify()
+			
+	def clear( self ):
+		'''
+		Close every idle connection
+		'''
+		with self.condition:
+			for key, idle in self.idle.iteritems():
+				for connection, released in idle:
+					connection.close()
+				self.counts[key] -= len( idle )
+			self.idle = {}
+			self.condition.notify_all()
+			
+	@classmethod
+	def split_url( cls, url ):
+		'''
+		Returns the (scheme, host, port) of url
+		'''
+		scheme, separator, rest = url.strip().partition( "://" )
+		if scheme not in ('http', 'https'):
+			raise InvalidConnectionProtocolError( "Invalid Connection Protocol: accepted protocols are: HTTP and HTTPS" )
+		host, separator, port = rest.partition( '/' )[0].partition( ':' )
+		if port:
+			port = int( port )
+		else:
+			port = 443 if scheme == 'https' else 80
+		return (scheme, host, port)
+		
+	def _create( self, key ):
+		scheme, host, port = key
+		if scheme == 'https':
+			connection = httplib.HTTPSConnection( host, port, timeout=self.timeout )
+		else:
+			connection = httplib.HTTPConnection( host, port, timeout=self.timeout )
+		connection.pool_key = key
+		return connection
+		
+	def _discard( self, key ):
+		with self.condition:
+			self.counts[key] -= 1
+			self.condition.notify()
+		
+	def _take_idle( self, key ):
+		'''
+		Returns the most recently released healthy connection to key, or None. The lock must be held
+		'''
+		idle = self.idle.get( key )
+		while idle:
+			connection, released = idle.pop()
+			if self._is_healthy( connection ):
+				return connection
+			connection.close()
+			self.counts[key] -= 1
+		return None
+		
+	def _evict( self ):
+		'''
+		Close the connections that have been idle longer than idle_timeout. The lock must be held
+		'''
+		expired = time.time() - self.idle_timeout
+		for key, idle in self.idle.iteritems():
+			#The list is in the order the connections were released
+			while idle and idle[0][1] < expired:
+				idle.pop( 0 )[0].close()
+				self.counts[key] -= 1
+				
+	def _is_healthy( self, connection ):
+		'''
+		An idle connection has nothing to read, if its socket is readable the
+		server has closed it( or sent something it shouldn't have)
+		'''
+		if connection.sock is None:
+			#Closed by httplib after a "Connection: close" response, it reconnects on the next request
+			return True
+		try:
+			readable = select.select( [connection.sock], [], [], 0 )[0]
+		except (select.error, socket.error, ValueError):
+			return False
+		return not readable
 
 
 class EbayAPIConnection():
@@ -475,14 +1626,25 @@ class EbayAPIConnection():
 	url = None
 	location = None
 	connection = None
-	filename = "/home/wes/it/Development/projects/python/ebay/api_tests/LMS_API/bulk_api_layout/api_credentials.json"#TODO: THIS MUST BE CONFIGURED ON INSTALL
+	filename = None#Path of the api_credentials.json structure, None to use CredentialsCache.filename
 	token = None#Auth token: ONLY USED WITH GLOBAL CONFIGURATION
+	response = None
+	reader = None#The DecodedResponse get_response() returned last, it holds a pooled connection until it's read or closed
+	sent_at = None#time.time() the last request was sent at
+	timeout = 30#Socket timeout in seconds
+	latency_tracker = None#ebay.latency.LatencyTracker that records the latency of every call, and adapts the timeout of read calls
+	accept_encoding = 'gzip, deflate'#Response encodings the server may compress with, None to receive them uncompressed
+	compress_requests = False#True to gzip request bodies, only for endpoints that accept Content-Encoding: gzip
+	compress_min_size = 1024#Request bodies smaller than this many bytes are sent uncompressed
+	pool = ConnectionPool()#Connections are kept open between requests, None to open a new connection for every EbayAPIConnection
+	rate_limiter = None#ebay.ratelimit.RateLimiter every request waits on before it's sent, None to send right away
+	rate_limit_wait = None#Most seconds a request waits on the rate_limiter before RateLimitExceeded is raised, None to wait as long as it takes
 	
 	api_map = {
 		"TradingApiRequest": "trading_api",
 	}#Maps the request class name to the name found in the credentials structure
 	
-	request_object = None#True if connection was created with an EbayApiRequest object, False otherwise
+	request_object = None#The EbayApiRequest the connection was created with, None otherwise
 	
 	def __init__( self, headers=None, api=None, environment=None, request=None ):
 		'''
@@ -502,45 +1664,28 @@ class EbayAPIConnection():
 		if request:
 			if not isinstance(request, EbayApiRequest ):
 				raise InvalidRequestError( "request must be a valid EbayApiRequest object" )
-			self.request_object = request.get_element()
+			if not request.validated:
+				raise DataNotValidatedError( "Data Not Validated: Validate the data by calling update()" )
+			self.request_object = request
 			environment = request.environment
-			api = None
-			for key in self.api_map:
-				if key in str(request.__class__.__bases__):
-					api = self.api_map[key]
-			if not api:
-				raise InvalidRequestError( "request is not correctly mapped to credentials" )
+			api = self.get_api_name( request )
 				
 			#Read api_credentials.json structure
 			#And attempt to get the correct information
-			self.headers = request.headers
+			self.headers = dict( request.headers )#A copy, the credential headers are added to it
 			self._get_credentials( api, environment )
-		
-
-			#Determine if the connection is http or https and create the connection
-			split_url = self.url.strip().partition( "://" )
-			connection_protocol = split_url[0]
-			url = split_url[2]
-			#print connection_protocol
-			if connection_protocol == 'http':
-				self.connection = httplib.HTTPConnection( url )
-			elif connection_protocol == 'https':
-				self.connection = httplib.HTTPSConnection( url )
-			else:
-				raise InvalidConnectionProtocolError( "Invalid Connection Protocol: accepted protocols are: HTTP and HTTPS" )
+			if self.pool is None:
+				self._connect()
 			
 			
 		elif not headers and not api and environment:
-			fp = open( self.filename, mode='r' )
-			credentials = simplejson.load( fp )
-			fp.close()
-			self.token = credentials['_keys'][environment]['auth_token']
+			self.token = CredentialsCache.get_token( environment, self.filename )
 			
 			
 		else:
 			#Set headers
 			if headers:
-				self.headers = headers
+				self.headers = dict( headers )
 			else:
 				self.headers = {}
 				#raise ImproperHeadersError( "Must supply valid Headers, they cannot be NoneType!" )
@@ -554,21 +1699,44 @@ class EbayAPIConnection():
 			#Read api_credentials.json structure
 			#And attempt to get the correct information
 			self._get_credentials( api, self.environment )
-		
-
-			#Determine if the connection is http or https and create the connection
-			split_url = self.url.strip().partition( "://" )
-			connection_protocol = split_url[0]
-			url = split_url[2]
-			#print connection_protocol
-			if connection_protocol == 'http':
-				self.connection = httplib.HTTPConnection( url, timeout=30 )
-			elif connection_protocol == 'https':
-				self.connection = httplib.HTTPSConnection( url, timeout=30 )
-			else:
-				raise InvalidConnectionProtocolError( "Invalid Connection Protocol: accepted protocols are: HTTP and HTTPS" )
+			if self.pool is None:
+				self._connect()
 			
 
+	@classmethod
+	def get_api_name( cls, request ):
+		'''
+		Returns the name of the api request belongs to in the credentials structure
+		'''
+		api = None
+		for key in cls.api_map:
+			if key in str(request.__class__.__bases__):
+				api = cls.api_map[key]
+		if not api:
+			raise InvalidRequestError( "request is not correctly mapped to credentials" )
+		return api
+		
+	def _connect( self ):
+		'''
+		Check out a connection to self.url from the pool, or create one if the pool is disabled
+		
+		A pooled connection is checked out by send_request(), when the request is
+		sent, and handed back once its response has been read
+		'''
+		if self.pool is not None:
+			self.connection = self.pool.get_connection( self.url )
+			return
+		#Determine if the connection is http or https and create the connection
+		split_url = self.url.strip().partition( "://" )
+		connection_protocol = split_url[0]
+		url = split_url[2]
+		if connection_protocol == 'http':
+			self.connection = httplib.HTTPConnection( url, timeout=self.timeout )
+		elif connection_protocol == 'https':
+			self.connection = httplib.HTTPSConnection( url, timeout=self.timeout )
+		else:
+			raise InvalidConnectionProtocolError( "Invalid Connection Protocol: accepted protocols are: HTTP and HTTPS" )
+
 	def _get_credentials( self, api, environment ):
 		'''
 		Read the api_credendtials.json structure and grab the required information
@@ -578,33 +1746,9 @@ class EbayAPIConnection():
 			api[string]: the name of the eBay API being connected to
 			environment[string]: Which environment the API is connecting to
 		'''
-		fp = open( self.filename, mode='r' )
-		credentials = simplejson.load( fp )
-		fp.close()
-		#Check that api is valid
-		if api not in credentials.keys():
-			raise InvalidAPIError( "Invalid API specified\nAcceptable APIs are: %s" % [key for key in credentials.keys() if key is not '_keys'])
-		else:
-			#Grab the url and location from credentials struct		
-			self.url = credentials[api].get(environment, {}).get("url", None )
-			self.location = credentials[api].get(environment, {}).get('location', None )
-			
-			if not self.url:
-				raise InvalidCredentialsError( "InvalidCredentialsError: URL invalid")
-			if not self.location:
-				raise InvalidCredentialsError( "InvalidCredentialsError: Location invalid" )
-			
-			#Grab the correct header information
-			keys = credentials.get( '_keys', None )
-			if not keys:
-				raise InvalidCredentialsError( "InvalidCredentialsError: '_keys' is missing" )
-			
-			headers = credentials[api].get('_extra_headers', None )
-			if not headers:
-				raise InvalidCredentialsError( "InvalidCredentialsError: _extra_headers is missing")
-			#Add the extra headers to self.headers
-			for key,value in headers.iteritems():
-				self.headers[key] = keys[environment][value]
+		self.url, self.location, headers = CredentialsCache.get_connection_info( api, environment, self.filename )
+		#Add the extra headers to self.headers
+		self.headers.update( headers )
 				
 	def send_request( self, request=None ):
 		'''
@@ -618,37 +1762,123 @@ class EbayAPIConnection():
 			properly built. That is done in the EbayApiRequest object for the specific
 			call.
 		'''
-		assert self.connection
 		if isinstance( request, basestring ):
 			request = request
 		elif isinstance( request, EbayApiRequest ):
-			request = etree.tostring(request.get_element(), pretty_print=False, xml_declaration=True, encoding='UTF-8')
+			request = request.get_xml( xml_declaration=True )
 		else:
 			if self.request_object is not None:
-				request = etree.tostring( self.request_object, pretty_print=False, xml_declaration=True, encoding='UTF-8' )
+				request = self.request_object.get_xml( xml_declaration=True )
 			else:
 				raise InvalidRequestError( "Request type is invalid\nAcceptable request types are: %s" % list( basestring,EbayApiRequest) )
 		
-		self.connection.request( "POST", self.location, request, self.headers )
+		if self.rate_limiter is not None:
+			self.rate_limiter.acquire( self.headers.get( 'X-EBAY-API-APP-NAME' ), self.headers.get( 'X-EBAY-API-CALL-NAME' ), self.rate_limit_wait )
+		
+		timeout = self.timeout
+		if self.latency_tracker is not None:
+			timeout = self.latency_tracker.get_timeout( self.headers.get( 'X-EBAY-API-CALL-NAME' ), timeout )
+		
+		headers = dict( self.headers )
+		if self.accept_encoding:
+			headers['Accept-Encoding'] = self.accept_encoding
+		if self.compress_requests and len( request ) >= self.compress_min_size:
+			request = compress_body( request )
+			headers['Content-Encoding'] = 'gzip'
+		
+		if self.connection is None:
+			self._connect()
+		self.response = None
+		self.sent_at = time.time()
+		try:
+			try:
+				self._set_timeout( timeout )
+				self.connection.request( "POST", self.location, request, headers )
+			except (socket.error, httplib.HTTPException):
+				if not getattr( self.connection, 'reused', False ):
+					raise
+				#The server closed the kept-alive connection before the request went out, retry on a new one
+				self._release( False )
+				self._connect()
+				self._set_timeout( timeout )
+				self.connection.request( "POST", self.location, request, headers )
+		except:
+			self._release( False )
+			raise
+		
+	def _set_timeout( self, timeout ):
+		'''
+		Set the socket timeout of the connection, a pooled connection may already be connected
+		'''
+		self.connection.timeout = timeout
+		if self.connection.sock is not None:
+			self.connection.sock.settimeout( timeout )
 		
 	
 	def get_response( self ):
 		'''
 		Returns the response recieved from the eBay server after accepting a request
+		
+		The response is a DecodedResponse, its read() returns the body decompressed.
+		A pooled connection is handed over to the response, which gives it back to
+		the pool once the body has been read, or as not reusable when it's closed
+		or dropped before that.
 		'''
 		assert self.connection
-		self.response = self.connection.getresponse()
+		try:
+			self.response = self.connection.getresponse()
+		except:
+			self._release( False )
+			raise
+		if self.latency_tracker is not None and self.sent_at is not None:
+			self.latency_tracker.record( self.headers.get( 'X-EBAY-API-CALL-NAME' ), time.time() - self.sent_at )
 		if self.response.status != 200:
-			raise ConnectionError( "Error sending request: %s" % self.response.reason )
+			self._release( False )
+			raise HTTPStatusError( "Error sending request: %s" % self.response.reason, self.response.status )
 		else:
-			return self.response
+			on_close = None
+			if self._is_pooled( self.connection ):
+				on_close = functools.partial( self.pool.release, self.connection )
+				self.connection = None
+			self.reader = DecodedResponse( self.response, on_close )
+			return self.reader
 			
 	def close_connection( self ):
 		'''
-		Closes the connection, Should only call this if connection is open
+		Closes the connection
+		
+		A pooled connection is handed back to the pool instead, to be kept open
+		for the next request if its response has been read completely. The
+		object can still send requests afterwards, it connects again.
 		'''
-		assert self.connection
-		self.connection.close()
+		if self.reader is not None:
+			self.reader.close()
+			self.reader = None
+		if self.connection is None:
+			return
+		if self._is_pooled( self.connection ):
+			self._release( False )
+		else:
+			self.connection.close()
+			
+	def __del__( self ):
+		#A request that was sent but whose response wasn't taken still holds its pooled connection
+		if self.connection is not None:
+			self._release( False )
+			
+	def _is_pooled( self, connection ):
+		return self.pool is not None and hasattr( connection, 'pool_key' )
+			
+	def _release( self, reusable ):
+		'''
+		Hand the current connection back to the pool, if it's pooled. Connections
+		that aren't pooled are kept, httplib reconnects them when needed.
+		'''
+		connection = self.connection
+		if connection is None or not self._is_pooled( connection ):
+			return
+		self.connection = None
+		self.pool.release( connection, reusable )
 
 class InvalidRequest(Exception):
 	pass
@@ -682,6 +1912,9 @@ class InvalidTopLevelRequest( Exception ):
 class InvalidDataType( Exception ):
 	pass
 
+class InvalidRequestData( Exception ):
+	pass
+
 class ImproperHeadersError( Exception ):
 	pass
 
@@ -700,7 +1933,16 @@ class InvalidCredentialsError( Exception ):
 class InvalidRequestError( Exception ):
 	pass
 
+class PoolTimeoutError( Exception ):
+	pass
+
 class ConnectionError( Exception ):
 	pass
 
+class HTTPStatusError( ConnectionError ):
+	
+	def __init__( self, message, status ):
+		ConnectionError.__init__( self, message )
+		self.status = status#The HTTP status code of the response
+
 
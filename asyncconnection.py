@@ -0,0 +1,580 @@
+#    This module is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.#
+#
+#    This module is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Wesley Hansen"
+__email__ = "wes@ridersdiscount.com"
+__date__ = "06/15/2012 11:38:39 AM"
+'''
+Sends many requests at once from a single thread, over non-blocking sockets
+'''
+
+import collections
+import errno
+import fcntl
+import heapq
+import itertools
+import os
+import select
+import socket
+import ssl
+import threading
+import time
+from ebay import EbayApiRequest, EbayAPIConnection, ConnectionPool, CredentialsCache, Decompressor, compress_body
+from ebay import InvalidRequestError, DataNotValidatedError, ConnectionError, HTTPStatusError
+from ebay.futures import Future
+
+CONNECTING = 'connecting'
+HANDSHAKE = 'handshake'
+SENDING = 'sending'
+RECEIVING = 'receiving'
+
+would_block = (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINPROGRESS)
+
+
+class AsyncEbayAPIConnection():
+	'''
+	The non-blocking counterpart of EbayAPIConnection. It accepts the same
+	EbayApiRequest objects, and keeps up to max_concurrency of them in flight
+	from one event loop thread, multiplexing their sockets with select().
+
+		connection = AsyncEbayAPIConnection( max_concurrency=20 )
+		future = connection.send( get_item )
+		body = future.result()
+
+		bodies = connection.gather( get_item_requests )
+
+	send() returns right away with a Future of the body of the response. The
+	requests beyond max_concurrency wait in a queue until a request finishes.
+	Connections are kept open between requests to the same host, as in
+	ConnectionPool.
+
+	EbayAPIConnection.rate_limiter applies here too: send() reserves the call
+	on it, and a request the limiter delays is held back until its send time
+	without blocking the others. send() raises RateLimitExceeded when the call
+	can't be made within EbayAPIConnection.rate_limit_wait.
+	'''
+	max_concurrency = 20#Most requests in flight at a time
+	timeout = 30#Seconds a request may take, from the time it's sent to the end of its response
+
+	def __init__( self, max_concurrency=None, timeout=None, filename=None, limit=None ):
+		'''
+		Args:
+			max_concurrency[int]: (Optional) Most requests in flight at a time
+			timeout[float]: (Optional) Seconds a request may take
+			filename[str]: (Optional) Path of the api_credentials.json structure, defaults to EbayAPIConnection.filename
+			limit[AdaptiveConcurrencyLimit]: (Optional) Limits the requests in flight per call name,
+			within max_concurrency. It may be shared with other connections and threads
+		'''
+		if max_concurrency is not None:
+			self.max_concurrency = max_concurrency
+		if timeout is not None:
+			self.timeout = timeout
+		self.filename = filename
+		self.limit = limit
+		self.lock = threading.Lock()
+		self.queue = collections.deque()#Exchanges waiting for a free slot
+		self.delayed = []#Heap of (send time, number, exchange) for the exchanges the rate_limiter holds back
+		self.numbers = itertools.count()
+		self.channels = []#Channels with a request in flight
+		self.idle = {}#Maps each (scheme, host, port) to a list of its idle channels
+		self.thread = None
+		self.closed = False
+		self.wake_read, self.wake_write = os.pipe()
+		fcntl.fcntl( self.wake_write, fcntl.F_SETFL, os.O_NONBLOCK )#A full pipe already wakes the loop, _wake() never blocks on it
+		if limit is not None:
+			#A slot released by another thread lets a queued request go
+			limit.add_listener( self._wake )
+
+	def send( self, request ):
+		'''
+		Queue a request to be sent
+
+		Args:
+			request[EbayApiRequest]: A validated request, or an xml string along with url and headers
+			as (xml, url, location, headers)
+
+		Returns:
+			A Future of the body of the response, or of the exception the request raised
+
+		Raises:
+			RateLimitExceeded: EbayAPIConnection.rate_limiter can't let the call through
+			within EbayAPIConnection.rate_limit_wait
+		'''
+		exchange = self._prepare( request )
+		send_time = None
+		rate_limiter = EbayAPIConnection.rate_limiter
+		if rate_limiter is not None:
+			send_time = rate_limiter.schedule( exchange.app_key, exchange.call_name, EbayAPIConnection.rate_limit_wait )
+		with self.lock:
+			if self.closed:
+				raise InvalidRequestError( "The connection has been closed" )
+			if send_time is not None and send_time > time.time():
+				heapq.heappush( self.delayed, (send_time, self.numbers.next(), exchange) )
+			else:
+				self.queue.append( exchange )
+			if self.thread is None:
+				self.thread = threading.Thread( target=self._run, name="AsyncEbayAPIConnection" )
+				self.thread.daemon = True
+				self.thread.start()
+		self._wake()
+		return exchange.future
+
+	def gather( self, requests, return_exceptions=False ):
+		'''
+		Send every request, and wait for all of them
+
+		Args:
+			requests[iterable]: The requests to send, see send()
+			return_exceptions[bool]: (Optional) True to return the exception a request raised
+			in place of its body, instead of raising it
+
+		Returns:
+			The bodies of the responses, in the order of the requests
+		'''
+		futures = [self.send( request ) for request in requests]
+		results = []
+		for future in futures:
+			if return_exceptions:
+				error = future.exception()
+				results.append( future.value if error is None else error )
+			else:
+				results.append( future.result() )
+		return results
+
+	def close( self ):
+		'''
+		Wait for the requests that were sent, then close every connection
+		'''
+		with self.lock:
+			self.closed = True
+			thread = self.thread
+		self._wake()
+		if thread is not None:
+			thread.join()
+		if self.limit is not None:
+			self.limit.remove_listener( self._wake )
+		os.close( self.wake_read )
+		os.close( self.wake_write )
+
+	def _prepare( self, request ):
+		'''
+		Serialize a request into an Exchange, in the caller's thread
+		'''
+		if isinstance( request, EbayApiRequest ):
+			if not request.validated:
+				raise DataNotValidatedError( "Data Not Validated: Validate the data by calling update()" )
+			api = EbayAPIConnection.get_api_name( request )
+			url, location, extra_headers = CredentialsCache.get_connection_info( api, request.environment, self.filename or EbayAPIConnection.filename )
+			headers = dict( request.headers )
+			headers.update( extra_headers )
+			body = request.get_xml( xml_declaration=True )
+		elif isinstance( request, tuple ):
+			body, url, location, headers = request
+		else:
+			raise InvalidRequestError( "Request type is invalid\nAcceptable request types are: EbayApiRequest, (xml, url, location, headers)" )
+		#Negotiate compression the same way EbayAPIConnection does
+		headers = dict( headers )
+		if EbayAPIConnection.accept_encoding:
+			headers['Accept-Encoding'] = EbayAPIConnection.accept_encoding
+		if EbayAPIConnection.compress_requests and len( body ) >= EbayAPIConnection.compress_min_size:
+			body = compress_body( body )
+			headers['Content-Encoding'] = 'gzip'
+		key = ConnectionPool.split_url( url )
+		exchange = Exchange( key, location, headers, body )
+		exchange.call_name = getattr( request, 'call_name', None ) or headers.get( 'X-EBAY-API-CALL-NAME' )
+		exchange.app_key = headers.get( 'X-EBAY-API-APP-NAME' )
+		return exchange
+
+	def _wake( self ):
+		try:
+			os.write( self.wake_write, 'x' )
+		except OSError:
+			pass
+
+	def _run( self ):
+		while True:
+			with self.lock:
+				now = time.time()
+				while self.delayed and self.delayed[0][0] <= now:
+					self.queue.append( heapq.heappop( self.delayed )[2] )
+				self._start_queued()
+				if self.closed and not self.queue and not self.channels and not self.delayed:
+					break
+				deadline = self.delayed[0][0] if self.delayed else None#The next request the rate_limiter holds back
+
+			now = time.time()
+			readers = [self.wake_read]
+			writers = []
+			for channel in self.channels:
+				if channel.want_write:
+					writers.append( channel )
+				else:
+					readers.append( channel )
+				if deadline is None or channel.deadline < deadline:
+					deadline = channel.deadline
+			wait = None if deadline is None else max( 0, deadline - now )
+			try:
+				readable, writable, failed = select.select( readers, writers, [], wait )
+			except select.error as e:
+				if e.args[0] == errno.EINTR:
+					continue
+				raise
+
+			if self.wake_read in readable:
+				os.read( self.wake_read, 4096 )
+				readable.remove( self.wake_read )
+			for channel in readable + writable:
+				self._step( channel )
+			now = time.time()
+			for channel in list( self.channels ):
+				if channel.deadline <= now:
+					self._finish( channel, error=socket.timeout( "The request did not finish within %s seconds" % self.timeout ) )
+
+		for idle in self.idle.itervalues():
+			for channel in idle:
+				channel.close()
+		self.idle = {}
+
+	def _start_queued( self ):
+		'''
+		Start the queued requests, in order, while there are free slots. A request
+		whose call has no free slot in the limit stays queued without holding back
+		the requests of other calls behind it, until a slot is released( which
+		wakes the loop, see add_listener())
+		'''
+		waiting = collections.deque()
+		blocked = set()#Call names that had no free slot
+		while self.queue and len( self.channels ) < self.max_concurrency:
+			exchange = self.queue.popleft()
+			if self.limit is not None and (exchange.call_name in blocked or not self.limit.try_acquire( exchange.call_name )):
+				blocked.add( exchange.call_name )
+				waiting.append( exchange )
+				continue
+			self._start( exchange )
+		if waiting:
+			waiting.extend( self.queue )
+			self.queue = waiting
+
+	def _start( self, exchange, reuse=True ):
+		exchange.started = time.time()
+		channel = None
+		idle = self.idle.get( exchange.key )
+		while reuse and idle and channel is None:
+			channel = idle.pop()
+			if not channel.is_healthy():
+				channel.close()
+				channel = None
+		if channel is None:
+			channel = Channel( exchange.key )
+		self.channels.append( channel )
+		try:
+			channel.start( exchange, time.time() + self.timeout )
+		except Exception as e:
+			self._finish( channel, error=e )
+			return
+		if channel.state != CONNECTING:
+			self._step( channel )
+
+	def _step( self, channel ):
+		try:
+			done = channel.step()
+		except StaleChannel:
+			#The server closed the kept-alive connection, send the request again on a new one
+			exchange = channel.exchange
+			self.channels.remove( channel )
+			channel.close()
+			self._start( exchange, reuse=False )
+			return
+		except Exception as e:
+			self._finish( channel, error=e )
+			return
+		if done:
+			self._finish( channel )
+
+	def _finish( self, channel, error=None ):
+		self.channels.remove( channel )
+		exchange = channel.exchange
+		channel.exchange = None
+		if error is None and channel.reader.status != 200:
+			error = HTTPStatusError( "Error sending request: %s" % channel.reader.reason, channel.reader.status )
+		if error is None and channel.reader.keep_alive:
+			self.idle.setdefault( channel.key, [] ).append( channel )
+		else:
+			channel.close()
+		body = None
+		if error is None:
+			body = channel.reader.get_body()
+		if self.limit is not None:
+			self.limit.release( exchange.call_name, time.time() - exchange.started, error, body )
+		if error is None:
+			exchange.future.set_result( body )
+		else:
+			exchange.future.set_exception( error )
+
+
+class Exchange():
+	'''
+	A request waiting to be sent, and the future of its response
+	'''
+
+	def __init__( self, key, location, headers, body ):
+		scheme, host, port = key
+		if port != (443 if scheme == 'https' else 80):
+			host = '%s:%s' % (host, port)
+		lines = ['POST %s HTTP/1.1' % location, 'Host: %s' % host, 'Content-Length: %s' % len( body )]
+		for name, value in headers.iteritems():
+			if name.lower() not in ('host', 'content-length'):
+				lines.append( '%s: %s' % (name, value) )
+		lines.append( '' )
+		lines.append( '' )
+		self.message = '\r\n'.join( lines ) + body
+		self.key = key
+		self.future = Future()
+		self.call_name = None
+		self.app_key = None
+		self.started = None
+
+
+class Channel():
+	'''
+	One non-blocking connection, stepping through connecting, the TLS
+	handshake, sending a request and receiving its response as its socket
+	becomes ready
+	'''
+	context = None#ssl.SSLContext shared by the https channels, created on first use
+
+	def __init__( self, key ):
+		self.key = key
+		self.sock = None
+		self.state = None
+		self.want_write = False
+		self.exchange = None
+		self.reused = False
+		self.reader = None
+		self.deadline = None
+		self.offset = 0
+
+	def fileno( self ):
+		return self.sock.fileno()
+
+	def start( self, exchange, deadline ):
+		self.exchange = exchange
+		self.deadline = deadline
+		self.reader = HTTPResponseReader()
+		self.offset = 0
+		if self.sock is None:
+			self._connect()
+		else:
+			self.reused = True
+			self.state = SENDING
+			self.want_write = True
+
+	def _connect( self ):
+		scheme, host, port = self.key
+		family, socktype, proto, name, address = socket.getaddrinfo( host, port, 0, socket.SOCK_STREAM )[0]
+		self.sock = socket.socket( family, socktype, proto )
+		self.sock.setblocking( 0 )
+		error = self.sock.connect_ex( address )
+		if error and error not in would_block:
+			raise socket.error( error, os.strerror( error ) )
+		self.state = CONNECTING
+		self.want_write = True
+
+	def step( self ):
+		'''
+		Make as much progress as the socket allows, returns True once the response has been read
+		'''
+		try:
+			if self.state == CONNECTING:
+				error = self.sock.getsockopt( socket.SOL_SOCKET, socket.SO_ERROR )
+				if error:
+					raise socket.error( error, os.strerror( error ) )
+				if self.key[0] == 'https':
+					if Channel.context is None:
+						Channel.context = ssl.create_default_context()
+					self.sock = Channel.context.wrap_socket( self.sock, server_hostname=self.key[1], do_handshake_on_connect=False )
+					self.state = HANDSHAKE
+				else:
+					self.state = SENDING
+			if self.state == HANDSHAKE:
+				self.sock.do_handshake()
+				self.state = SENDING
+			if self.state == SENDING:
+				message = self.exchange.message
+				while self.offset < len( message ):
+					self.offset += self.sock.send( buffer( message, self.offset ) )
+				self.state = RECEIVING
+				self.want_write = False
+			while True:
+				data = self.sock.recv( 65536 )
+				if not data:
+					if self.reused and not self.reader.received:
+						raise StaleChannel()
+					self.reader.feed_eof()
+					self.reader.keep_alive = False
+					return True
+				if self.reader.feed( data ):
+					return True
+		except ssl.SSLWantReadError:
+			self.want_write = False
+		except ssl.SSLWantWriteError:
+			self.want_write = True
+		except socket.error as e:
+			if e.args[0] not in would_block:
+				if self.reused and self.state in (SENDING, RECEIVING) and not self.reader.received:
+					raise StaleChannel()
+				raise
+			self.want_write = self.state != RECEIVING
+		return False
+
+	def is_healthy( self ):
+		'''
+		An idle connection has nothing to read, if it's readable the server has closed it
+		'''
+		try:
+			return not select.select( [self.sock], [], [], 0 )[0]
+		except (select.error, socket.error, ValueError):
+			return False
+
+	def close( self ):
+		if self.sock is not None:
+			try:
+				self.sock.close()
+			except socket.error:
+				pass
+			self.sock = None
+
+
+class HTTPResponseReader():
+	'''
+	Incrementally parses an HTTP/1.1 response, fed the bytes as they arrive.
+	A gzip or deflate encoded body is decompressed as it arrives too.
+	'''
+
+	def __init__( self ):
+		self.buffer = ''
+		self.status = None
+		self.reason = None
+		self.headers = None
+		self.body = []
+		self.received = 0
+		self.keep_alive = True
+		self.length = None#Bytes of the body left to read, None when the body isn't sized by Content-Length
+		self.chunked = False
+		self.chunk = None#Bytes of the current chunk left to read, None when a chunk size line is next
+		self.done = False
+		self.decompressor = None
+
+	def feed( self, data ):
+		'''
+		Returns True once the whole response has been read
+		'''
+		self.received += len( data )
+		self.buffer += data
+		if self.headers is None:
+			end = self.buffer.find( '\r\n\r\n' )
+			if end < 0:
+				return False
+			self._parse_head( self.buffer[:end] )
+			self.buffer = self.buffer[end + 4:]
+		if self.chunked:
+			self._read_chunks()
+		elif self.length is not None:
+			data, self.buffer = self.buffer[:self.length], self.buffer[self.length:]
+			self._append( data )
+			self.length -= len( data )
+			self.done = self.length == 0
+		elif not self.done:
+			#Read until the server closes the connection
+			self._append( self.buffer )
+			self.buffer = ''
+		return self.done
+
+	def feed_eof( self ):
+		if self.headers is not None and not self.chunked and self.length is None:
+			self.done = True
+		if not self.done:
+			raise ConnectionError( "The server closed the connection before the response was complete" )
+
+	def get_body( self ):
+		if self.decompressor is not None and self.done:
+			self.body.append( self.decompressor.flush() )
+			self.decompressor = None
+		return ''.join( self.body )
+
+	def _append( self, data ):
+		if self.decompressor is not None:
+			data = self.decompressor.decompress( data )
+		self.body.append( data )
+
+	def _parse_head( self, head ):
+		lines = head.split( '\r\n' )
+		version, status, self.reason = (lines[0].split( ' ', 2 ) + [''])[:3]
+		self.status = int( status )
+		self.headers = {}
+		for line in lines[1:]:
+			name, separator, value = line.partition( ':' )
+			self.headers[name.strip().lower()] = value.strip()
+		connection = self.headers.get( 'connection', '' ).lower()
+		if version == 'HTTP/1.0':
+			self.keep_alive = connection == 'keep-alive'
+		else:
+			self.keep_alive = connection != 'close'
+		encoding = self.headers.get( 'content-encoding', '' ).lower()
+		if encoding in Decompressor.encodings:
+			self.decompressor = Decompressor( encoding )
+		if 'chunked' in self.headers.get( 'transfer-encoding', '' ).lower():
+			self.chunked = True
+		elif 'content-length' in self.headers:
+			self.length = int( self.headers['content-length'] )
+			self.done = self.length == 0
+		elif self.status in (204, 304) or 100 <= self.status < 200:
+			self.done = True
+		else:
+			self.keep_alive = False
+
+	def _read_chunks( self ):
+		while not self.done:
+			if self.chunk is None:
+				end = self.buffer.find( '\r\n' )
+				if end < 0:
+					return
+				self.chunk = int( self.buffer[:end].split( ';' )[0], 16 )
+				self.buffer = self.buffer[end + 2:]
+				if self.chunk == 0:
+					self.chunk = -1#Trailers are next
+			elif self.chunk == -1:
+				if self.buffer.startswith( '\r\n' ):
+					end = 0
+				else:
+					end = self.buffer.find( '\r\n\r\n' )
+					if end < 0:
+						return
+					end += 2
+				self.buffer = self.buffer[end + 2:]
+				self.done = True
+			elif self.chunk > 0:
+				data, self.buffer = self.buffer[:self.chunk], self.buffer[self.chunk:]
+				self._append( data )
+				self.chunk -= len( data )
+				if self.chunk:
+					return
+				self.chunk = -2#The CRLF after the chunk is next
+			else:
+				if len( self.buffer ) < 2:
+					return
+				self.buffer = self.buffer[2:]
+				self.chunk = None
+
+
+class StaleChannel( Exception ): pass
@@ -329,10 +329,11 @@ class BulkDataFile(EbayApiRequest):
 			xmlstr = xml
 		elif(isinstance(xml, etree._Element)):
 			xmlstr = etree.tostring(xml, pretty_print=False)
-		elif(isinstance(xml, TradingApiRequest)):
-			xmlstr = etree.tostring(xml.get_element(), pretty_print=True)
+		elif(isinstance(xml, EbayApiRequest)):
+			#Reuse the request's serialized xml, the request's etree is never built
+			xmlstr = xml.get_xml()
 		else:
-			raise ValueError("xml is not a supported argument type, expected one of (basestring, lxml.etree.Element, ebay.trading.TradingApiRequest")
+			raise ValueError("xml is not a supported argument type, expected one of (basestring, lxml.etree.Element, ebay.EbayApiRequest")
 			
 		request_type = self._parse_request_type(xmlstr) # Error gets raised here if it can't determine or improper request type...
 		#Now make sure the detected request type is the same request type they told us they were going to be doing.
@@ -0,0 +1,191 @@
+#    This module is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.#
+#
+#    This module is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Wesley Hansen"
+__email__ = "wes@ridersdiscount.com"
+__date__ = "06/15/2012 11:38:39 AM"
+'''
+Adapts the number of requests in flight to how eBay is responding
+'''
+
+import socket
+import threading
+import time
+from ebay import HTTPStatusError
+from ebay.retry import error_code_pattern
+
+OK = 'ok'
+OVERLOAD = 'overload'#Throttled, a 5xx, a timeout or a latency spike: back off
+ERROR = 'error'#Failed for a reason unrelated to load: leave the limit alone
+
+
+class AdaptiveConcurrencyLimit():
+	'''
+	An in-flight limit per call name, adjusted by additive increase /
+	multiplicative decrease( AIMD):
+		-Every request that succeeds in a healthy time raises the limit of its
+		call by increase / limit, so about increase per limit's worth of requests
+		-A request that's throttled, gets a 5xx, times out or takes longer than
+		spike_factor times the call's average latency multiplies the limit by
+		backoff, at most once every decrease_interval seconds. Latency only
+		counts once min_samples requests of the call have been averaged, and
+		never below min_spike_latency seconds, so the jitter of a fast call
+		( 5ms then 15ms) isn't mistaken for overload
+
+	Callers acquire() a slot before sending a request and release() it with
+	the outcome afterwards:
+
+		limit = AdaptiveConcurrencyLimit( max_limit=64 )
+		for index, body, error in execute_many( requests, workers=64, limit=limit ):
+
+		connection = AsyncEbayAPIConnection( max_concurrency=64, limit=limit )
+	'''
+	initial_limit = 4
+	min_limit = 1
+	max_limit = 64
+	increase = 1.0
+	backoff = 0.5
+	spike_factor = 2.5
+	min_spike_latency = 1.0#Seconds, a request faster than this is never a latency spike
+	min_samples = 10#Healthy requests averaged before a call's latency spikes are looked for
+	decrease_interval = 1.0#Seconds, so a burst of failures from one overload only backs off once
+	smoothing = 0.1#Weight of the latest latency in the average latency
+	throttle_statuses = (429, 500, 502, 503, 504)
+	throttle_error_codes = ('518', '10007')#Call usage limit reached, internal error
+
+	def __init__( self, initial_limit=None, min_limit=None, max_limit=None ):
+		'''
+		Args:
+			All optional, they default to the class attributes of the same name
+		'''
+		if initial_limit is not None:
+			self.initial_limit = initial_limit
+		if min_limit is not None:
+			self.min_limit = min_limit
+		if max_limit is not None:
+			self.max_limit = max_limit
+		self.condition = threading.Condition()
+		self.calls = {}#Maps each call name to its CallLimit
+		self.listeners = []#Called with no arguments every time a slot is released
+
+	def add_listener( self, listener ):
+		'''
+		Call listener() every time a slot is released, for the callers that
+		can't wait in acquire()( the event loop of AsyncEbayAPIConnection)
+		'''
+		with self.condition:
+			self.listeners.append( listener )
+
+	def remove_listener( self, listener ):
+		with self.condition:
+			if listener in self.listeners:
+				self.listeners.remove( listener )
+
+	def get_limit( self, call_name ):
+		'''
+		Returns the current in-flight limit of call_name
+		'''
+		with self.condition:
+			return int( self._get( call_name ).limit )
+
+	def acquire( self, call_name, timeout=None ):
+		'''
+		Wait for a slot of call_name, returns False if none was free within timeout seconds
+		'''
+		deadline = None if timeout is None else time.time() + timeout
+		with self.condition:
+			call = self._get( call_name )
+			while call.in_flight >= int( call.limit ):
+				if deadline is None:
+					self.condition.wait()
+				else:
+					remaining = deadline - time.time()
+					if remaining <= 0:
+						return False
+					self.condition.wait( remaining )
+			call.in_flight += 1
+			return True
+
+	def try_acquire( self, call_name ):
+		'''
+		Take a slot of call_name if one is free right away
+		'''
+		return self.acquire( call_name, 0 )
+
+	def release( self, call_name, latency, error=None, body=None ):
+		'''
+		Give back the slot of a finished request, and adjust the limit by its outcome
+
+		Args:
+			call_name[str]: The call name the slot was acquired for
+			latency[float]: Seconds the request took
+			error[Exception]: (Optional) The exception the request raised
+			body[str]: (Optional) The body of its response
+		'''
+		outcome = self.classify( error, body )
+		with self.condition:
+			call = self._get( call_name )
+			call.in_flight -= 1
+			if outcome == OK and call.samples >= self.min_samples and latency > max( call.average * self.spike_factor, self.min_spike_latency ):
+				outcome = OVERLOAD
+			if outcome == OK:
+				call.limit = min( self.max_limit, call.limit + self.increase / call.limit )
+				if call.average is None:
+					call.average = latency
+				else:
+					call.average += (latency - call.average) * self.smoothing
+				call.samples += 1
+			elif outcome == OVERLOAD:
+				now = time.time()
+				if now - call.last_decrease >= self.decrease_interval:
+					call.limit = max( self.min_limit, call.limit * self.backoff )
+					call.last_decrease = now
+			self.condition.notify_all()
+			listeners = list( self.listeners )
+		for listener in listeners:
+			listener()
+
+	def classify( self, error=None, body=None ):
+		'''
+		Returns OK, OVERLOAD or ERROR for the outcome of a request
+		'''
+		if error is not None:
+			if isinstance( error, HTTPStatusError ):
+				return OVERLOAD if error.status in self.throttle_statuses else ERROR
+			if isinstance( error, socket.timeout ):
+				return OVERLOAD
+			return ERROR
+		if body and '<Errors>' in body:
+			for code in error_code_pattern.findall( body ):
+				if code in self.throttle_error_codes:
+					return OVERLOAD
+		return OK
+
+	def _get( self, call_name ):
+		call = self.calls.get( call_name )
+		if call is None:
+			call = self.calls[call_name] = CallLimit( self.initial_limit )
+		return call
+
+
+class CallLimit():
+	'''
+	The state of the limit of one call name
+	'''
+
+	def __init__( self, limit ):
+		self.limit = float( limit )
+		self.in_flight = 0
+		self.average = None#Average latency of the healthy requests
+		self.samples = 0#Number of healthy requests averaged
+		self.last_decrease = 0
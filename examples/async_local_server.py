@@ -0,0 +1,118 @@
+"""
+Runs the AsyncEbayAPIConnection against a local stand-in for eBay, a threaded
+BaseHTTPServer that echoes each request body back after a short delay
+
+Checks that:
+	every response comes back to the future of its own request
+	no more than max_concurrency requests are in flight at a time
+	kept-alive connections are reused between requests
+	chunked responses are read whole
+	a refused connection and a server that never answers fail their futures
+
+Usage:
+	python async_local_server.py [number_of_requests]
+"""
+
+import sys
+import time
+import socket
+import threading
+import BaseHTTPServer
+import SocketServer
+from ebay.asyncconnection import AsyncEbayAPIConnection
+
+DELAY = 0.05#Seconds the server takes to answer
+
+
+class StandInHandler( BaseHTTPServer.BaseHTTPRequestHandler ):
+	protocol_version = 'HTTP/1.1'
+
+	def do_POST( self ):
+		body = self.rfile.read( int( self.headers['Content-Length'] ) )
+		server = self.server
+		with server.lock:
+			server.clients.add( self.client_address )
+			server.active += 1
+			server.peak = max( server.peak, server.active )
+		time.sleep( DELAY )
+		with server.lock:
+			server.active -= 1
+
+		self.send_response( 200 )
+		if 'chunked' in body:
+			self.send_header( 'Transfer-Encoding', 'chunked' )
+			self.end_headers()
+			for part in ('<Echo>', body, '</Echo>'):
+				self.wfile.write( '%x\r\n%s\r\n' % (len( part ), part) )
+			self.wfile.write( '0\r\n\r\n' )
+		else:
+			body = '<Echo>%s</Echo>' % body
+			self.send_header( 'Content-Length', str( len( body ) ) )
+			self.end_headers()
+			self.wfile.write( body )
+
+	def log_message( self, *args ):
+		pass
+
+class StandInServer( SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer ):
+	daemon_threads = True
+
+	def __init__( self ):
+		BaseHTTPServer.HTTPServer.__init__( self, ('127.0.0.1', 0), StandInHandler )
+		self.lock = threading.Lock()
+		self.clients = set()#The (host, port) of every connection the server accepted
+		self.active = 0
+		self.peak = 0
+
+
+def start_server():
+	server = StandInServer()
+	thread = threading.Thread( target=server.serve_forever )
+	thread.daemon = True
+	thread.start()
+	return server
+
+def silent_server():
+	'''
+	Returns a listening socket that accepts connections and never answers
+	'''
+	listener = socket.socket( socket.AF_INET, socket.SOCK_STREAM )
+	listener.bind( ('127.0.0.1', 0) )
+	listener.listen( 5 )
+	return listener
+
+
+if __name__ == '__main__':
+	number = 40
+	if len( sys.argv ) > 1:
+		number = int( sys.argv[1] )
+
+	server = start_server()
+	url = 'http://127.0.0.1:%s' % server.server_port
+	headers = {'X-EBAY-API-CALL-NAME': 'GetItem'}
+	bodies = ['<Request%s>%s</Request%s>' % (index, 'chunked' if index % 3 == 0 else '', index) for index in range( number )]
+
+	connection = AsyncEbayAPIConnection( max_concurrency=5, timeout=5 )
+	start = time.time()
+	responses = connection.gather( [(body, url, '/ws/api.dll', headers) for body in bodies] )
+	seconds = time.time() - start
+
+	assert responses == ['<Echo>%s</Echo>' % body for body in bodies]
+	assert server.peak <= 5
+	assert len( server.clients ) <= 5
+	print "%s requests in %.2fs( %.2fs sequentially), at most %s in flight over %s connections" % (
+		number, seconds, number * DELAY, server.peak, len( server.clients ) )
+
+	#Nothing listens on port 1
+	error = connection.send( ('<Request/>', 'http://127.0.0.1:1', '/ws/api.dll', headers) ).exception( 5 )
+	assert isinstance( error, socket.error )
+	print "Refused connection: %r" % error
+	connection.close()
+
+	listener = silent_server()
+	connection = AsyncEbayAPIConnection( timeout=0.5 )
+	error = connection.send( ('<Request/>', 'http://127.0.0.1:%s' % listener.getsockname()[1], '/ws/api.dll', headers) ).exception( 5 )
+	assert isinstance( error, socket.timeout )
+	print "Server that never answers: %r" % error
+	connection.close()
+	listener.close()
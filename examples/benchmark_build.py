@@ -0,0 +1,105 @@
+"""
+Benchmarks building the <Item> container of an AddItem request with the
+compiled SerializationPlan against the recursive _build_item_container()
+
+The plan is typically about 1.3x faster on this payload, and timings vary
+from run to run by as much as 0.3x, so compare several runs.
+
+Usage:
+	python benchmark_build.py [number_of_requests]
+"""
+
+import sys
+import timeit
+from lxml import etree
+from ebay.trading import AddItemRequest
+
+
+request = AddItemRequest( False, False )
+request.update( {
+	'listing_type': 'Chinese',
+	'picture_details': {
+		'picture_url' : 'http://i1.sandbox.ebayimg.com/03/i/00/a6/17/13_1.JPG?set_id=8800005007',
+	},
+	'subtitle': 'Hello!',
+	'sku': '13523-358',
+	'uuid': '3285-972389-57403587-34957',
+	'description': 'THis is a test example, woo hoo!',
+	'buy_it_now_price': 100.00,
+	'condition_id': '1000',
+	'category_mapping_allowed': 'True',
+	'pay_pal_email_address': 'wes@ridersdiscount.com',
+	'title': 'Super Dooper Awesome Megacool Helmet',
+	'primary_category': {
+		'category_id': '6749',
+	},
+	'start_price': 75.00,
+	'dispatch_time_max': 3,
+	'listing_duration': 'Days_7',
+	'payment_methods': ['PayPal', 'VisaMC', 'AmEx', 'Discover'],
+	'location': 'Holland, MI, USA',
+	'postal_code': '49424',
+	'quantity': 1,
+	'return_policy': {
+		'returns_accepted_option': 'ReturnsAccepted',
+		'refund_option': 'MoneyBack',
+		'returns_within_option': 'Days_30',
+		'description': 'This is the first book in the Harry Potter series. In excellent condition!',
+		'shipping_cost_paid_by_option': 'Buyer',
+	},
+	'shipping_details': {
+		'shipping_type': 'Flat',
+		'shipping_service_options': {
+			'shipping_service_priority': 1,
+			'shipping_service': 'ShippingMethodStandard',
+			'shipping_service_cost': 19.98,
+		},
+		'international_shipping_service_option':[
+		{
+			'shipping_service': 'StandardInternational',
+			'shipping_service_cost': 29.98,
+			'shipping_service_priority': 2,
+			'ship_to_location': 'CA',
+		},
+		{
+			'shipping_service': 'StandardInternational',
+			'shipping_service_cost': 39.98,
+			'shipping_service_priority': 3,
+			'ship_to_location': ['Americas', 'Europe', 'Asia', 'AU'],
+		},],
+		'exclude_ship_to_location': [],
+	},
+	'site': 'eBayMotors',
+	'country': 'US',
+	'currency': 'USD',
+} )
+data = request.get_data()
+plan = request.get_serialization_plan()
+
+
+def build_recursive():
+	item = etree.Element( "Item" )
+	request._build_item_container( item, data )
+	return item
+
+def build_plan():
+	item = etree.Element( "Item" )
+	plan.build( item, data )
+	return item
+
+
+if __name__ == '__main__':
+	number = 20000
+	if len( sys.argv ) > 1:
+		number = int( sys.argv[1] )
+
+	#Both builders must produce the exact same xml
+	assert etree.tostring( build_recursive() ) == etree.tostring( build_plan() )
+
+	recursive = min( timeit.repeat( build_recursive, number=number, repeat=3 ) )
+	compiled = min( timeit.repeat( build_plan, number=number, repeat=3 ) )
+
+	print "Built %s <Item> containers" % number
+	print "  _build_item_container: %.3fs (%.1fus per request)" % (recursive, recursive / number * 1e6)
+	print "  SerializationPlan:     %.3fs (%.1fus per request)" % (compiled, compiled / number * 1e6)
+	print "  Speedup: %.2fx" % (recursive / compiled)
@@ -0,0 +1,45 @@
+"""
+Benchmarks the cold-start cost of importing ebay.trading
+
+Every measurement runs in a fresh interpreter:
+	import:        import ebay.trading
+	first call:    import ebay.trading and load the AddItem class from the registry
+	eager:         import ebay.trading and every registered call module along with
+	               lxml, httplib and simplejson( what importing the package used to cost)
+
+Usage:
+	python benchmark_import.py [number_of_runs]
+"""
+
+import sys
+import subprocess
+
+SCENARIOS = (
+	('import', "import ebay.trading"),
+	('first call', "import ebay.trading; ebay.trading.get('AddItem', 747)"),
+	('eager', "import ebay.trading, lxml.etree, httplib, simplejson; "
+			  "[ebay.trading.get(call, version) for call, version in ebay.trading.registry]"),
+)
+
+TIMER = '''
+import time
+start = time.time()
+%s
+sys.stdout.write( repr( time.time() - start ) )
+'''
+
+def time_import( statement ):
+	code = "import sys\n" + TIMER % statement
+	output = subprocess.check_output( [sys.executable, '-c', code] )
+	return float( output )
+
+
+if __name__ == '__main__':
+	runs = 20
+	if len( sys.argv ) > 1:
+		runs = int( sys.argv[1] )
+
+	print "Cold imports, best of %s runs" % runs
+	for name, statement in SCENARIOS:
+		best = min( time_import( statement ) for run in xrange( runs ) )
+		print "  %-12s %.1fms" % (name + ':', best * 1000)
@@ -0,0 +1,132 @@
+"""
+Benchmarks parsing a large GetItem response with the ResponseParser against
+naive xml to dict conversions: the usual recursive ElementTree recipe, a
+minidom walk, and xmltodict when it's installed
+
+Usage:
+	python benchmark_parse.py [number_of_responses]
+"""
+
+import sys
+import timeit
+from xml.dom import minidom
+from xml.etree import cElementTree
+from ebay.response import ResponseParser
+from ebay.trading import GetItemRequest
+
+try:
+	import xmltodict
+except ImportError:
+	xmltodict = None
+
+
+def build_response( specifics=100, variations=150 ):
+	'''
+	Returns the xml of a GetItem response with a large <Item>
+	'''
+	parts = ['<?xml version="1.0" encoding="UTF-8"?>',
+		'<GetItemResponse xmlns="urn:ebay:apis:eBLBaseComponents">',
+		'<Timestamp>2012-06-15T11:38:39.123Z</Timestamp><Ack>Success</Ack><Version>747</Version><Build>E747_CORE_BUNDLED_14891042_R1</Build>',
+		'<Item><AutoPay>false</AutoPay><BuyItNowPrice currencyID="USD">0.0</BuyItNowPrice><Country>US</Country><Currency>USD</Currency>',
+		'<Description><![CDATA[%s]]></Description>' % ('<p>Super Dooper Awesome Megacool Helmet</p>' * 500),
+		'<ItemID>110012345678</ItemID><ListingDetails><StartTime>2012-06-15T11:38:39.000Z</StartTime>',
+		'<EndTime>2012-06-22T11:38:39.000Z</EndTime><ViewItemURL>http://cgi.sandbox.ebay.com/ws/eBayISAPI.dll?ViewItem&amp;item=110012345678</ViewItemURL></ListingDetails>',
+		'<ListingDuration>GTC</ListingDuration><ListingType>FixedPriceItem</ListingType><Location>Holland, MI, USA</Location>',
+		'<PaymentMethods>PayPal</PaymentMethods><PaymentMethods>VisaMC</PaymentMethods><PrimaryCategory><CategoryID>6749</CategoryID>',
+		'<CategoryName>eBay Motors:Parts &amp; Accessories:Apparel</CategoryName></PrimaryCategory><Quantity>250</Quantity>',
+		'<SellingStatus><BidCount>0</BidCount><CurrentPrice currencyID="USD">75.0</CurrentPrice><QuantitySold>12</QuantitySold>',
+		'<ListingStatus>Active</ListingStatus></SellingStatus><ShippingDetails><ShippingType>Flat</ShippingType>',
+	]
+	for priority in range( 1, 4 ):
+		parts.append( '<ShippingServiceOptions><ShippingService>ShippingMethodStandard</ShippingService>'
+			'<ShippingServiceCost currencyID="USD">%s.98</ShippingServiceCost><ShippingServicePriority>%s</ShippingServicePriority>'
+			'<ExpeditedService>false</ExpeditedService></ShippingServiceOptions>' % (priority * 10, priority) )
+	parts.append( '</ShippingDetails><SKU>13523-358</SKU><Title>Super Dooper Awesome Megacool Helmet</Title><ItemSpecifics>' )
+	for index in range( specifics ):
+		parts.append( '<NameValueList><Name>Specific %s</Name><Value>Value %s</Value><Source>ItemSpecific</Source></NameValueList>' % (index, index) )
+	parts.append( '</ItemSpecifics><Variations>' )
+	for index in range( variations ):
+		parts.append( '<Variation><SKU>13523-358-%s</SKU><StartPrice currencyID="USD">%s.99</StartPrice><Quantity>%s</Quantity>'
+			'<VariationSpecifics><NameValueList><Name>Size</Name><Value>%s</Value></NameValueList></VariationSpecifics>'
+			'<SellingStatus><QuantitySold>%s</QuantitySold></SellingStatus></Variation>' % (index, 50 + index, index % 7, index, index % 3) )
+	parts.append( '</Variations></Item></GetItemResponse>' )
+	return ''.join( parts )
+
+
+def etree_to_dict( element ):
+	'''
+	The recursive ElementTree conversion most hand-rolled parsers use
+	'''
+	children = list( element )
+	if not children:
+		if element.attrib:
+			return {'_attr': dict( element.attrib ), 'value': element.text}
+		return element.text
+	data = {}
+	for child in children:
+		tag = child.tag.split( '}', 1 )[-1]
+		value = etree_to_dict( child )
+		if tag in data:
+			if not isinstance( data[tag], list ):
+				data[tag] = [data[tag]]
+			data[tag].append( value )
+		else:
+			data[tag] = value
+	return data
+
+def minidom_to_dict( node ):
+	elements = [child for child in node.childNodes if child.nodeType == child.ELEMENT_NODE]
+	if not elements:
+		return ''.join( child.data for child in node.childNodes if child.nodeType in (child.TEXT_NODE, child.CDATA_SECTION_NODE) )
+	data = {}
+	for child in elements:
+		value = minidom_to_dict( child )
+		if child.localName in data:
+			if not isinstance( data[child.localName], list ):
+				data[child.localName] = [data[child.localName]]
+			data[child.localName].append( value )
+		else:
+			data[child.localName] = value
+	return data
+
+
+body = build_response()
+parser = ResponseParser.for_request( GetItemRequest )
+
+def parse_response_parser():
+	return parser.parse( body ).data
+
+def parse_elementtree():
+	return etree_to_dict( cElementTree.fromstring( body ) )
+
+def parse_minidom():
+	return minidom_to_dict( minidom.parseString( body ).documentElement )
+
+def parse_xmltodict():
+	return xmltodict.parse( body )
+
+
+if __name__ == '__main__':
+	number = 200
+	if len( sys.argv ) > 1:
+		number = int( sys.argv[1] )
+
+	data = parse_response_parser()
+	assert data['ack'] == 'Success' and len( data['item']['variations']['variation'] ) == 150
+	assert data['item']['selling_status']['current_price']['value'] == 75.0
+
+	parsers = [
+		('ResponseParser', parse_response_parser),
+		('ElementTree recipe', parse_elementtree),
+		('minidom', parse_minidom),
+	]
+	if xmltodict is not None:
+		parsers.append( ('xmltodict', parse_xmltodict) )
+
+	print "Parsed %s GetItem responses of %s bytes" % (number, len( body ))
+	fastest = None
+	for name, function in parsers:
+		seconds = min( timeit.repeat( function, number=number, repeat=5 ) )
+		if fastest is None:
+			fastest = seconds
+		print "  %-20s %.3fs (%.0fus per response, %.2fx the ResponseParser)" % (name + ':', seconds, seconds / number * 1e6, seconds / fastest)
@@ -0,0 +1,148 @@
+"""
+Tests that pooled connections go back to the ConnectionPool, against a local
+stand-in for eBay( a threaded BaseHTTPServer answering every request with <Ack/>)
+
+Usage:
+	python test_connection_pool.py
+"""
+
+import gc
+import threading
+import BaseHTTPServer
+import SocketServer
+from ebay import EbayAPIConnection, ConnectionPool, PoolTimeoutError, HTTPStatusError
+
+BODY = '<Ack>Success</Ack>' * 4096#Larger than a socket buffer, so a response can be left half read
+
+
+class StandInHandler( BaseHTTPServer.BaseHTTPRequestHandler ):
+	protocol_version = 'HTTP/1.1'
+
+	def do_POST( self ):
+		request = self.rfile.read( int( self.headers['Content-Length'] ) )
+		if request == '<Fail/>':
+			self.send_response( 503 )
+			body = 'Service Unavailable'
+		else:
+			self.send_response( 200 )
+			body = BODY
+		self.send_header( 'Content-Length', str( len( body ) ) )
+		self.end_headers()
+		self.wfile.write( body )
+
+	def log_message( self, *args ):
+		pass
+
+class StandInServer( SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer ):
+	daemon_threads = True
+
+	def handle_error( self, request, client_address ):
+		pass#The connections closed before their response was read are reset
+
+
+server = StandInServer( ('127.0.0.1', 0), StandInHandler )
+thread = threading.Thread( target=server.serve_forever )
+thread.daemon = True
+thread.start()
+
+
+class LocalConnection( EbayAPIConnection ):
+	'''
+	Sends every request to the stand-in server instead of the url in api_credentials.json
+	'''
+	def _get_credentials( self, api, environment ):
+		self.url = 'http://127.0.0.1:%s' % server.server_port
+		self.location = '/ws/api.dll'
+
+def send( request='<Request/>' ):
+	connection = LocalConnection( headers={}, api='trading_api', environment='sandbox' )
+	connection.send_request( request )
+	return connection.get_response()
+
+def in_use( pool ):
+	'''
+	Returns the number of connections checked out of pool
+	'''
+	with pool.condition:
+		return sum( pool.counts.values() ) - sum( len( idle ) for idle in pool.idle.values() )
+
+LocalConnection.pool = pool = ConnectionPool( max_per_host=2, wait_timeout=1.0 )
+
+
+#############################################################
+#Testing responses that are read completely
+#Expecting one connection to be reused for every request
+#############################################################
+for number in range( 10 ):
+	assert send().read() == BODY
+assert in_use( pool ) == 0 and sum( pool.counts.values() ) == 1
+print "Read responses: connection reused"
+
+#############################################################
+#Testing responses that are dropped without being read
+#Expecting their connections to be freed when they're collected
+#############################################################
+for number in range( 10 ):
+	send()
+gc.collect()
+assert in_use( pool ) == 0
+print "Dropped responses: connections freed"
+
+#############################################################
+#Testing responses that are read in part, then closed
+#Expecting their connections to be freed, and not reused
+#############################################################
+for number in range( 5 ):
+	response = send()
+	assert response.read( 100 ) == BODY[:100]
+	response.close()
+	assert in_use( pool ) == 0
+print "Half read responses: connections freed"
+
+#############################################################
+#Testing responses that are kept without being read
+#Expecting PoolTimeoutError once max_per_host are held, and
+#closing one of them to free a connection
+#############################################################
+held = [send(), send()]
+try:
+	send()
+	raise AssertionError( "Expected PoolTimeoutError" )
+except PoolTimeoutError:
+	pass
+held.pop().close()
+assert send().read() == BODY
+del held
+gc.collect()
+assert in_use( pool ) == 0
+print "Held responses: PoolTimeoutError, then freed by close()"
+
+#############################################################
+#Testing requests whose response is never taken, and failed requests
+#Expecting their connections to be freed
+#############################################################
+for number in range( 5 ):
+	LocalConnection( headers={}, api='trading_api', environment='sandbox' ).send_request( '<Request/>' )
+	try:
+		send( '<Fail/>' )
+		raise AssertionError( "Expected HTTPStatusError" )
+	except HTTPStatusError:
+		pass
+gc.collect()
+assert in_use( pool ) == 0
+print "Unanswered and failed requests: connections freed"
+
+#############################################################
+#Testing close_connection() before and after reading
+#Expecting the connection to be usable afterwards
+#############################################################
+connection = LocalConnection( headers={}, api='trading_api', environment='sandbox' )
+for number in range( 3 ):
+	connection.send_request( '<Request/>' )
+	response = connection.get_response()
+	if number % 2:
+		response.read()
+	connection.close_connection()
+	assert in_use( pool ) == 0
+print "close_connection(): connection freed"
+server.shutdown()
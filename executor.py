@@ -0,0 +1,136 @@
+#    This module is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.#
+#
+#    This module is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Wesley Hansen"
+__email__ = "wes@ridersdiscount.com"
+__date__ = "06/15/2012 11:38:39 AM"
+'''
+Runs batches of requests across a pool of worker threads
+'''
+
+import threading
+import time
+import Queue
+from ebay import EbayAPIConnection
+
+
+def send_request( request ):
+	'''
+	Send a request over a connection checked out of EbayAPIConnection.pool,
+	and return the body of the response
+	'''
+	connection = EbayAPIConnection( request=request )
+	try:
+		connection.send_request()
+		return connection.get_response().read()
+	finally:
+		connection.close_connection()
+
+def execute_many( requests, workers=8, ordered=True, send=None, max_pending=None, limit=None ):
+	'''
+	Send a batch of requests from several worker threads
+
+	Each worker sends one request at a time over its own connection, checked
+	out of the shared ConnectionPool( keep workers at or below its
+	max_per_host, or they wait for each other's connections). A request that
+	raises doesn't stop the batch, its exception is yielded in place of its
+	result:
+
+		for index, body, error in execute_many( get_item_requests, workers=16 ):
+			if error is not None:
+				failed.append( index )
+
+	The requests are read from the iterable as the workers need them, so a
+	batch of any size only keeps max_pending requests in memory.
+
+	Args:
+		requests[iterable]: The validated EbayApiRequests to send
+		workers[int]: (Optional) Number of worker threads
+		ordered[bool]: (Optional) True to yield the results in the order of the requests,
+		False to yield them as they complete
+		send[callable]: (Optional) Sends a request and returns its result, defaults to send_request()
+		max_pending[int]: (Optional) Most requests read but not yet yielded, defaults to 4 per worker
+		limit[AdaptiveConcurrencyLimit]: (Optional) Limits the requests in flight per call name,
+		the workers wait on it before sending. workers is then the most the limit can reach
+
+	Yields:
+		(index of the request, result, None) for each request that succeeded and
+		(index of the request, None, exception) for each one that raised
+	'''
+	send = send or send_request
+	max_pending = max_pending or workers * 4
+	tasks = Queue.Queue()
+	results = Queue.Queue()
+	threads = []
+	for number in xrange( workers ):
+		thread = threading.Thread( target=_work, args=(tasks, results, send, limit), name="execute_many-%s" % number )
+		thread.daemon = True
+		thread.start()
+		threads.append( thread )
+
+	requests = enumerate( requests )
+	exhausted = False
+	pending = 0#Requests read but not yet yielded
+	finished = {}#Results that are waiting for the results before them, when ordered
+	next_index = 0
+	try:
+		while True:
+			while not exhausted and pending < max_pending:
+				try:
+					task = requests.next()
+				except StopIteration:
+					exhausted = True
+					break
+				tasks.put( task )
+				pending += 1
+			if not pending:
+				break
+
+			result = results.get()
+			if not ordered:
+				pending -= 1
+				yield result
+				continue
+			finished[result[0]] = result
+			while next_index in finished:
+				pending -= 1
+				yield finished.pop( next_index )
+				next_index += 1
+	finally:
+		#Drop the requests no worker has started, if the batch was abandoned
+		while True:
+			try:
+				tasks.get_nowait()
+			except Queue.Empty:
+				break
+		for thread in threads:
+			tasks.put( None )
+
+def _work( tasks, results, send, limit ):
+	while True:
+		task = tasks.get()
+		if task is None:
+			return
+		index, request = task
+		if limit is not None:
+			call_name = getattr( request, 'call_name', None )
+			limit.acquire( call_name )
+			started = time.time()
+		body = error = None
+		try:
+			body = send( request )
+		except Exception as e:
+			error = e
+		if limit is not None:
+			limit.release( call_name, time.time() - started, error, body )
+		results.put( (index, body, error) )
@@ -0,0 +1,125 @@
+#    This module is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.#
+#
+#    This module is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Wesley Hansen"
+__email__ = "wes@ridersdiscount.com"
+__date__ = "06/15/2012 11:38:39 AM"
+'''
+A minimal Future for requests that are sent in the background
+'''
+
+import sys
+import threading
+import time
+
+
+class Future():
+	'''
+	The pending result of a request that is sent by another thread.
+
+	The thread that sends the request calls set_result() or set_exception()
+	once, any thread can wait for it with result().
+	'''
+
+	def __init__( self ):
+		self.condition = threading.Condition()
+		self.finished = False
+		self.value = None
+		self.error = None#exc_info tuple of the exception the request raised
+		self.callbacks = []
+
+	def done( self ):
+		'''
+		Returns True if the result or exception has been set
+		'''
+		return self.finished
+
+	def result( self, timeout=None ):
+		'''
+		Wait for the request and return its result, or raise its exception
+
+		Args:
+			timeout[float]: (Optional) Seconds to wait before raising FutureTimeout, None to wait forever
+		'''
+		self._wait( timeout )
+		if self.error is not None:
+			raise self.error[0], self.error[1], self.error[2]
+		return self.value
+
+	def exception( self, timeout=None ):
+		'''
+		Wait for the request and return the exception it raised, None if it succeeded
+		'''
+		self._wait( timeout )
+		if self.error is not None:
+			return self.error[1]
+		return None
+
+	def add_done_callback( self, callback ):
+		'''
+		Call callback( future) once the future is done, right away if it already is
+		'''
+		with self.condition:
+			if not self.finished:
+				self.callbacks.append( callback )
+				return
+		callback( self )
+
+	def set_result( self, value ):
+		self._finish( value, None )
+
+	def set_exception( self, exception, traceback=None ):
+		'''
+		Args:
+			exception[Exception]: The exception the request raised
+			traceback: (Optional) Its traceback, so result() re-raises it from where it happened
+		'''
+		self._finish( None, (type( exception ), exception, traceback) )
+
+	def set_exc_info( self, exc_info=None ):
+		'''
+		Set the exception currently being handled( sys.exc_info())
+		'''
+		exc_info = exc_info or sys.exc_info()
+		self._finish( None, exc_info )
+
+	def _finish( self, value, error ):
+		with self.condition:
+			if self.finished:
+				raise FutureAlreadyDone( "The result of this future has already been set" )
+			self.value = value
+			self.error = error
+			self.finished = True
+			callbacks, self.callbacks = self.callbacks, []
+			self.condition.notify_all()
+		for callback in callbacks:
+			callback( self )
+
+	def _wait( self, timeout ):
+		with self.condition:
+			if timeout is None:
+				while not self.finished:
+					self.condition.wait()
+			else:
+				end = time.time() + timeout
+				while not self.finished:
+					remaining = end - time.time()
+					if remaining <= 0:
+						break
+					self.condition.wait( remaining )
+			if not self.finished:
+				raise FutureTimeout( "The request did not finish within %s seconds" % timeout )
+
+
+class FutureTimeout( Exception ): pass
+class FutureAlreadyDone( Exception ): pass
@@ -0,0 +1,160 @@
+#    This module is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.#
+#
+#    This module is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Wesley Hansen"
+__email__ = "wes@ridersdiscount.com"
+__date__ = "06/15/2012 11:38:39 AM"
+'''
+Tracks the latency of each call, to adapt the timeouts of read calls and hedge them
+'''
+
+import collections
+import sys
+import threading
+import Queue
+
+
+class LatencyTracker():
+	'''
+	Keeps the latest latencies( seconds from sending a request to receiving
+	the headers of its response) of each call name.
+
+	Once a read call has min_samples latencies, its timeout is
+	timeout_multiplier times its timeout_percentile latency, kept between
+	min_timeout and max_timeout. Calls that change listings keep the
+	default timeout, a timed out AddItem may have gone through.
+
+		EbayAPIConnection.latency_tracker = LatencyTracker()
+	'''
+	window = 200#Latencies kept per call name
+	min_samples = 20#Latencies needed before they're used
+	timeout_percentile = 99
+	timeout_multiplier = 3.0
+	min_timeout = 2.0
+	max_timeout = 30.0
+	read_calls = ('GetItem', 'GetItems', 'GetSellerList', 'GetOrders', 'GetItemTransactions', 'GetMyeBaySelling')#Idempotent calls whose timeouts are adapted
+
+	def __init__( self, read_calls=None ):
+		'''
+		Args:
+			read_calls[tuple]: (Optional) The idempotent calls, defaults to the class's read_calls
+		'''
+		if read_calls is not None:
+			self.read_calls = tuple( read_calls )
+		self.lock = threading.Lock()
+		self.samples = {}#Maps each call name to a deque of its latest latencies
+
+	def record( self, call_name, seconds ):
+		with self.lock:
+			samples = self.samples.get( call_name )
+			if samples is None:
+				samples = self.samples[call_name] = collections.deque( maxlen=self.window )
+			samples.append( seconds )
+
+	def get_percentile( self, call_name, percentile ):
+		'''
+		Returns the latency of call_name at percentile( 0-100), or None if it doesn't have min_samples latencies yet
+		'''
+		with self.lock:
+			samples = self.samples.get( call_name )
+			if samples is None or len( samples ) < self.min_samples:
+				return None
+			samples = sorted( samples )
+		index = min( len( samples ) - 1, int( len( samples ) * percentile / 100.0 ) )
+		return samples[index]
+
+	def get_timeout( self, call_name, default ):
+		'''
+		Returns the timeout for the next request of call_name, default for calls that aren't adapted
+		'''
+		if call_name not in self.read_calls:
+			return default
+		latency = self.get_percentile( call_name, self.timeout_percentile )
+		if latency is None:
+			return default
+		return min( self.max_timeout, max( self.min_timeout, latency * self.timeout_multiplier ) )
+
+
+class HedgedSender():
+	'''
+	Sends read calls, and sends a duplicate of a request that takes longer
+	than the hedge_percentile latency of its call. Whichever response arrives
+	first is returned, the other is read and dropped.
+
+		tracker = LatencyTracker()
+		EbayAPIConnection.latency_tracker = tracker
+		sender = HedgedSender( tracker )
+		body = sender.send( get_item )
+
+	Only the tracker's read_calls are hedged, any other request is sent once.
+	'''
+	hedge_percentile = 95
+
+	def __init__( self, tracker, send=None, hedge_percentile=None ):
+		'''
+		Args:
+			tracker[LatencyTracker]: The tracker the latencies are read from
+			send[callable]: (Optional) Sends a request and returns the body of the response,
+			defaults to ebay.executor.send_request()
+			hedge_percentile[int]: (Optional) Defaults to the class's hedge_percentile
+		'''
+		self.tracker = tracker
+		if send is None:
+			from ebay.executor import send_request as send
+		self.send_function = send
+		if hedge_percentile is not None:
+			self.hedge_percentile = hedge_percentile
+
+	def send( self, request ):
+		'''
+		Send a request, hedging it if it's a read call that runs late
+
+		Returns:
+			The body of the first response
+		'''
+		if request.call_name not in self.tracker.read_calls:
+			return self.send_function( request )
+		delay = self.tracker.get_percentile( request.call_name, self.hedge_percentile )
+		if delay is None:
+			return self.send_function( request )
+
+		#Serialize it before the threads share it, so they only read the cached xml
+		request.get_xml( xml_declaration=True )
+		results = Queue.Queue()
+		self._start( request, results )
+		try:
+			outcome = results.get( timeout=delay )
+			attempts = 1
+		except Queue.Empty:
+			self._start( request, results )
+			outcome = results.get()
+			attempts = 2
+		if outcome[1] is not None and attempts == 2:
+			#The first to finish failed, the other may still succeed
+			other = results.get()
+			if other[1] is None:
+				outcome = other
+		if outcome[1] is not None:
+			raise outcome[1][0], outcome[1][1], outcome[1][2]
+		return outcome[0]
+
+	def _start( self, request, results ):
+		thread = threading.Thread( target=self._attempt, args=(request, results), name="HedgedSender" )
+		thread.daemon = True
+		thread.start()
+
+	def _attempt( self, request, results ):
+		try:
+			results.put( (self.send_function( request ), None) )
+		except Exception:
+			results.put( (None, sys.exc_info()) )
@@ -0,0 +1,178 @@
+#    This module is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.#
+#
+#    This module is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Wesley Hansen"
+__email__ = "wes@ridersdiscount.com"
+__date__ = "06/15/2012 11:38:39 AM"
+'''
+Keeps the calls made with an application key within eBay's call limits
+'''
+
+import sqlite3
+import threading
+import time
+
+ANY_CALL = '*'#Limits keyed by ANY_CALL apply to the total of every call made with an application key
+
+
+class RateLimiter():
+	'''
+	Token buckets for each application key and call name.
+
+	The limits map a call name( the X-EBAY-API-CALL-NAME header) to
+	(calls, period in seconds) or (calls, period, burst). ANY_CALL limits the
+	total of all calls of an application key:
+
+		limiter = RateLimiter( '/var/run/ebay_quota.db', {
+			ANY_CALL: (5000, 86400),#The daily limit of the application
+			'ReviseItem': (1500, 3600),
+		} )
+
+	A call takes a token from its call's bucket and from the ANY_CALL bucket.
+	Each bucket holds up to burst tokens( defaults to calls) and refills at
+	calls / period tokens a second.
+
+	The buckets are kept in a SQLite database when given a path, every process
+	using the same path shares them, so any number of workers stay within the
+	limits together( create the limiter in each process, after forking). Without
+	a path they're kept in memory, for this process.
+
+	Set EbayAPIConnection.rate_limiter to make every request wait on it before
+	it's sent.
+
+	A token can be taken three ways:
+		acquire(): Wait until it's available
+		try_acquire(): Take it now or raise RateLimitExceeded
+		schedule(): Reserve it and get the time.time() to send the call at
+	'''
+	busy_timeout = 30.0#Seconds to wait for another process to release the database
+
+	def __init__( self, path=None, limits=None ):
+		'''
+		Args:
+			path[str]: (Optional) Path of the SQLite database shared by the processes, None to keep the buckets in memory
+			limits[dict]: (Optional) Maps call names, and ANY_CALL, to (calls, period) or (calls, period, burst)
+		'''
+		self.path = path
+		self.limits = {}
+		for call_name, limit in (limits or {}).iteritems():
+			self.set_limit( call_name, *limit )
+		self.lock = threading.Lock()
+		self.local = threading.local()#One SQLite connection per thread
+		self.buckets = {}#The in memory buckets, when there's no path
+		if path is not None:
+			self._get_connection()
+
+	def set_limit( self, call_name, calls, period, burst=None ):
+		'''
+		Limit call_name( or ANY_CALL) to calls every period seconds, with bursts of up to burst calls
+		'''
+		self.limits[call_name] = (float( calls ) / period, float( burst or calls ))
+
+	def acquire( self, app_key, call_name, timeout=None ):
+		'''
+		Wait until a call can be made, then take its tokens
+
+		Args:
+			app_key[str]: The application key( X-EBAY-API-APP-NAME)
+			call_name[str]: The call name( X-EBAY-API-CALL-NAME)
+			timeout[float]: (Optional) Most seconds to wait, RateLimitExceeded is raised without
+			taking the tokens if the call can't be made by then. None to wait as long as it takes
+		'''
+		delay = self.schedule( app_key, call_name, timeout ) - time.time()
+		if delay > 0:
+			time.sleep( delay )
+
+	def try_acquire( self, app_key, call_name ):
+		'''
+		Take the tokens of a call if it can be made right away, raise RateLimitExceeded otherwise
+		'''
+		self.schedule( app_key, call_name, 0 )
+
+	def schedule( self, app_key, call_name, max_wait=None ):
+		'''
+		Reserve the tokens of a call and return the time it can be sent at. The
+		tokens are taken now, so the call must be sent( at that time) or the
+		reservation is lost.
+
+		Args:
+			max_wait[float]: (Optional) Raise RateLimitExceeded instead of reserving the
+			tokens if the call can't be sent within max_wait seconds
+
+		Returns:
+			The time.time() the call can be sent at
+		'''
+		keys = []
+		for name in (call_name, ANY_CALL):
+			limit = self.limits.get( name )
+			if limit is not None:
+				keys.append( ("%s|%s" % (app_key, name), limit) )
+		if not keys:
+			return time.time()
+		if self.path is None:
+			with self.lock:
+				return self._reserve( keys, max_wait, self.buckets.get, self.buckets.__setitem__ )
+
+		connection = self._get_connection()
+		connection.execute( "BEGIN IMMEDIATE" )
+		try:
+			def get( key ):
+				return connection.execute( "SELECT tokens, updated FROM buckets WHERE key = ?", (key,) ).fetchone()
+			def put( key, state ):
+				connection.execute( "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)", (key,) + state )
+			send_time = self._reserve( keys, max_wait, get, put )
+		except:
+			connection.execute( "ROLLBACK" )
+			raise
+		connection.execute( "COMMIT" )
+		return send_time
+
+	def _reserve( self, keys, max_wait, get, put ):
+		'''
+		Take a token from each bucket, letting them go into debt for a call
+		that has to wait. get( key) returns a bucket's (tokens, updated time),
+		put( key, (tokens, updated time)) stores it.
+		'''
+		now = time.time()
+		states = []
+		wait = 0.0
+		for key, (rate, burst) in keys:
+			state = get( key )
+			if state is None:
+				tokens = burst
+			else:
+				tokens = min( burst, state[0] + (now - state[1]) * rate )
+			if tokens < 1:
+				wait = max( wait, (1 - tokens) / rate )
+			states.append( (key, tokens) )
+		if max_wait is not None and wait > max_wait:
+			raise RateLimitExceeded( "The call limit has been reached, the call can be made in %.1f seconds" % wait, wait )
+		for key, tokens in states:
+			put( key, (tokens - 1, now) )
+		return now + wait
+
+	def _get_connection( self ):
+		connection = getattr( self.local, 'connection', None )
+		if connection is None:
+			#isolation_level None, so the transactions are only the ones opened by schedule()
+			connection = sqlite3.connect( self.path, timeout=self.busy_timeout, isolation_level=None )
+			connection.execute( "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)" )
+			self.local.connection = connection
+		return connection
+
+
+class RateLimitExceeded( Exception ):
+
+	def __init__( self, message, retry_after ):
+		Exception.__init__( self, message )
+		self.retry_after = retry_after#Seconds until the call can be made
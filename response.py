@@ -0,0 +1,321 @@
+#    This module is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.#
+#
+#    This module is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Wesley Hansen"
+__email__ = "wes@ridersdiscount.com"
+__date__ = "06/15/2012 11:38:39 AM"
+'''
+Parses the xml responses returned by eBay into python data structures
+'''
+
+import datetime
+import inspect
+import re
+import threading
+from ebay import etree
+
+datetime_pattern = re.compile( r'^(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(?:\.(\d{1,6})\d*)?Z?$' )
+number_pattern = re.compile( r'^-?(?:0|[1-9]\d*)(\.\d+)?$' )
+missing = object()
+
+
+class ResponseParser():
+	'''
+	Turns the xml of an eBay response into the same kind of data structure
+	requests are built from, the inverse of _build_item_container():
+		<a>b</a>               -->   {'a': 'b'}
+		<a>b</a><a>c</a>       -->   {'a': ['b', 'c']}
+		<a><b>c</b></a>        -->   {'a': {'b': 'c'}}
+		<a b="c">d</a>         -->   {'a': {'_attr': {'b': 'c'}, 'value': 'd'}}
+
+	Tags are turned back into keys through the inverted key_map of the request
+	class, tags that aren't in it are converted from CamelCase( ShippingServiceCost
+	--> shipping_service_cost). The children of an *Array container( ItemArray,
+	OrderArray...) and the tags in list_tags are always lists, even when there's
+	only one of them.
+
+	Text is coerced by its form, except for the keys in text_keys and the ones
+	ending in _id which are left as strings( ItemIDs, SKUs and postal codes look
+	like numbers but aren't):
+		true/false                   -->   bool
+		2012-06-15T11:38:39.000Z     -->   datetime.datetime( UTC)
+		12, 9.99                     -->   int, float
+
+	Ack, Errors and Warnings are read without converting the rest of the
+	response:
+
+		parser = ResponseParser.for_request( GetItemRequest )
+		response = parser.parse( connection.get_response() )
+		if response.failed:
+			print response.errors
+		print response.data['item']['selling_status']['current_price']['value']
+
+	The XMLParser( which doesn't resolve entities or touch the network) and the
+	compiled XPath lookups are kept per thread and reused for every response, so
+	a parser can be shared by any number of threads.
+	'''
+	list_tags = frozenset( ['Errors', 'ErrorParameters', 'NameValueList', 'PictureURL', 'ShippingServiceOptions',
+		'InternationalShippingServiceOption', 'PaymentMethods', 'ShipToLocations', 'Variation'] )
+	text_keys = frozenset( ['sku', 'title', 'subtitle', 'description', 'postal_code', 'value', 'name', 'short_message',
+		'long_message', 'error_code', 'correlation_id', 'build', 'version', 'uuid'] )
+
+	max_cached_values = 20000#Most coerced values kept, the same texts( quantities, prices, flags...) come up in every response
+	max_cached_length = 32#Longer texts are coerced every time
+
+	_parsers = {}#Maps each request class to the ResponseParser of its key_map, see for_request()
+	_lock = threading.Lock()
+
+	def __init__( self, key_map=None, list_tags=None, text_keys=None ):
+		'''
+		Args:
+			key_map[dict]: (Optional) The key_map of the request class whose responses are parsed
+			list_tags, text_keys: (Optional) Default to the class attributes of the same name
+		'''
+		if list_tags is not None:
+			self.list_tags = frozenset( list_tags )
+		if text_keys is not None:
+			self.text_keys = frozenset( text_keys )
+		self.tag_keys = dict( (tag, key) for key, tag in (key_map or {}).iteritems() )
+		self.tags = {}#Maps each tag, with its namespace, to the info _get_tag() returns
+		self.values = {}#Maps the short texts that have been coerced to their values
+		self.local = threading.local()
+
+	@classmethod
+	def for_request( cls, request ):
+		'''
+		Returns the ResponseParser for the responses of a request class( or request),
+		created once per class and shared. None returns the parser without a key_map.
+		'''
+		request_class = request
+		if request is not None and not inspect.isclass( request ):
+			request_class = request.__class__
+		parser = cls._parsers.get( request_class )
+		if parser is None:
+			with cls._lock:
+				parser = cls._parsers.get( request_class )
+				if parser is None:
+					parser = cls._parsers[request_class] = cls( getattr( request_class, 'key_map', None ) )
+		return parser
+
+	def parse( self, source ):
+		'''
+		Parse a response
+
+		Args:
+			source: The body of the response as a string, or a file-like object to read it
+			from( the response returned by EbayAPIConnection.get_response())
+
+		Returns:
+			A ParsedResponse
+		'''
+		local = self._get_local()
+		if isinstance( source, basestring ):
+			if isinstance( source, unicode ):
+				source = source.encode( 'utf-8' )
+			root = etree.fromstring( source, local.parser )
+		else:
+			root = etree.parse( source, local.parser ).getroot()
+		return ParsedResponse( self, root )
+
+	def convert( self, element, array=None ):
+		'''
+		Returns the data structure of an element's children
+		'''
+		if array is None:
+			array = self._get_tag( element.tag )[2]
+		data = {}
+		tags = self.tags
+		values = self.values
+		for child in element:
+			info = tags.get( child.tag )
+			if info is None:
+				info = self._get_tag( child.tag )
+			key, listed, child_array, coerce = info
+			if key is None:
+				continue#An entity the parser left unresolved
+			attrib = child.attrib
+			if len( child ):
+				value = self.convert( child, child_array )
+				if attrib:
+					value['_attr'] = self._convert_attributes( attrib )
+			else:
+				value = child.text
+				if value is not None and coerce is not None:
+					coerced = values.get( value, missing )
+					if coerced is missing:
+						coerced = self._coerce( value, coerce )
+					value = coerced
+				if attrib:
+					value = {'_attr': self._convert_attributes( attrib ), 'value': value}
+
+			existing = data.get( key, missing )
+			if existing is missing:
+				data[key] = [value] if listed or array else value
+			elif existing.__class__ is list:
+				existing.append( value )
+			else:
+				data[key] = [existing, value]
+		return data
+
+	def _coerce( self, text, coerce ):
+		value = coerce( text )
+		if len( text ) <= self.max_cached_length and len( self.values ) < self.max_cached_values:
+			self.values[text] = value
+		return value
+
+	def _convert_attributes( self, attrib ):
+		return dict( (self._get_tag( name )[0], value) for name, value in attrib.iteritems() )
+
+	def _get_tag( self, tag ):
+		'''
+		Returns (key, True if the tag is always a list, True if its children are always
+		lists, the function coercing its text or None to leave it as is)
+		'''
+		info = self.tags.get( tag )
+		if info is None:
+			if not isinstance( tag, basestring ):
+				return (None, False, False, None)
+			name = tag[tag.rfind( '}' ) + 1:]
+			key = self.tag_keys.get( name )
+			if key is None:
+				key = camel_to_key( name )
+			coerce = coerce_text
+			if key in self.text_keys or key.endswith( '_id' ):
+				coerce = None
+			info = self.tags[tag] = (key, name in self.list_tags, name.endswith( 'Array' ), coerce)
+		return info
+
+	def _get_local( self ):
+		local = self.local
+		if getattr( local, 'parser', None ) is None:
+			local.parser = etree.XMLParser( resolve_entities=False, no_network=True, remove_blank_text=True, remove_comments=True, remove_pis=True )
+			local.ack = etree.XPath( 'string(/*/*[local-name()="Ack"])' )
+			local.errors = etree.XPath( '/*/*[local-name()="Errors"]' )
+			local.timestamp = etree.XPath( 'string(/*/*[local-name()="Timestamp"])' )
+		return local
+
+
+class ParsedResponse():
+	'''
+	A parsed eBay response. The response is only converted into a data
+	structure the first time data is asked for.
+
+	Attributes:
+		root[etree._Element]: The root element of the response
+		ack[str]: Success, Warning, Failure or PartialFailure
+		errors[list]: The Errors with a SeverityCode of Error, as dicts( error_code, short_message...)
+		warnings[list]: The Errors with a SeverityCode of Warning
+		timestamp[datetime.datetime]: When eBay handled the request
+	'''
+
+	def __init__( self, parser, root ):
+		self.parser = parser
+		self.root = root
+		local = parser._get_local()
+		self.ack = local.ack( root ) or None
+		self.timestamp = coerce_text( local.timestamp( root ) ) or None
+		self.errors = []
+		self.warnings = []
+		for element in local.errors( root ):
+			error = parser.convert( element )
+			if error.get( 'severity_code' ) == 'Warning':
+				self.warnings.append( error )
+			else:
+				self.errors.append( error )
+		self._data = None
+
+	@property
+	def succeeded( self ):
+		return self.ack in ('Success', 'Warning')
+
+	@property
+	def failed( self ):
+		return not self.succeeded
+
+	@property
+	def data( self ):
+		'''
+		The whole response as a data structure
+		'''
+		if self._data is None:
+			self._data = self.parser.convert( self.root )
+		return self._data
+
+	def get_error_codes( self ):
+		return [error.get( 'error_code' ) for error in self.errors]
+
+	def raise_for_errors( self ):
+		'''
+		Raise a ResponseError if eBay didn't accept the request
+		'''
+		if self.failed:
+			messages = ["%s: %s" % (error.get( 'error_code' ), error.get( 'long_message' ) or error.get( 'short_message' )) for error in self.errors]
+			raise ResponseError( "eBay returned %s: %s" % (self.ack, '; '.join( messages )), self )
+
+	def __getitem__( self, key ):
+		return self.data[key]
+
+	def get( self, key, default=None ):
+		return self.data.get( key, default )
+
+
+def coerce_text( text ):
+	'''
+	Returns text as a bool, datetime, int or float when it has the form of one
+	'''
+	if not text:
+		return text
+	first = text[0]
+	if first == 't' or first == 'f':
+		if text == 'true':
+			return True
+		if text == 'false':
+			return False
+		return text
+	if first.isdigit() or first == '-':
+		if text.isdigit() and (first != '0' or len( text ) == 1):
+			return int( text )
+		match = number_pattern.match( text )
+		if match is not None:
+			if match.group( 1 ) is None:
+				return int( text )
+			return float( text )
+		match = datetime_pattern.match( text )
+		if match is not None:
+			year, month, day, hour, minute, second, fraction = match.groups()
+			microsecond = int( fraction.ljust( 6, '0' ) ) if fraction else 0
+			return datetime.datetime( int( year ), int( month ), int( day ), int( hour ), int( minute ), int( second ), microsecond )
+	return text
+
+camel_pattern = re.compile( r'([A-Z]+)([A-Z][a-z])|([a-z0-9])([A-Z])' )
+
+def camel_to_key( tag ):
+	'''
+	Turn an xml tag into a key: ShippingServiceCost --> shipping_service_cost, PictureURL --> picture_url
+	'''
+	return camel_pattern.sub( lambda match: '%s_%s' % (match.group( 1 ) or match.group( 3 ), match.group( 2 ) or match.group( 4 )), tag ).lower()
+
+
+def parse_response( source, request=None ):
+	'''
+	Parse a response with the ResponseParser of request's class, or the
+	default ResponseParser if request is None
+	'''
+	return ResponseParser.for_request( request ).parse( source )
+
+
+class ResponseError( Exception ):
+
+	def __init__( self, message, response ):
+		Exception.__init__( self, message )
+		self.response = response#The ParsedResponse
@@ -0,0 +1,147 @@
+#    This module is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.#
+#
+#    This module is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Wesley Hansen"
+__email__ = "wes@ridersdiscount.com"
+__date__ = "06/15/2012 11:38:39 AM"
+'''
+Retries requests that failed for a transient reason
+'''
+
+import random
+import re
+import socket
+import time
+from ebay import EbayApiRequest, HTTPStatusError, httplib, uuid
+
+error_code_pattern = re.compile( r'<ErrorCode>\s*(\d+)\s*</ErrorCode>' )
+uuid_pattern = re.compile( r'^[0-9a-fA-F]{32}$' )
+message_id_namespace = '505831de-e7dc-4869-ac22-e0a626add701'#uuid5 namespace of the Item UUIDs derived from MessageIDs
+
+
+class RetryPolicy():
+	'''
+	Sends a request, retrying it with jittered exponential backoff when it
+	fails for a transient reason:
+		-A socket error or timeout, or a broken HTTP response
+		-An HTTP status in retry_statuses( eBay's 5xx brownouts)
+		-An eBay error in transient_error_codes in the body of the response
+
+	Any other failure is raised right away, and any other response is
+	returned. If every attempt failed, the last exception is raised, or the
+	last response returned if it was an eBay error.
+
+	Before the first attempt the request is stamped with a generated
+	MessageID, unless it has one, and a request that accepts a 'uuid' key
+	( AddItem...) gets an Item UUID derived from the MessageID unless it has
+	one. eBay refuses a second listing with the same UUID, so a retried
+	AddItem whose first attempt went through can't list the item twice.
+
+		policy = RetryPolicy( attempts=5 )
+		body = policy.send( add_item )
+
+		for index, body, error in execute_many( requests, send=policy.send ):
+	'''
+	attempts = 5#Most times a request is sent
+	base_delay = 0.5#Seconds to wait before the first retry, doubled for every retry after it
+	max_delay = 30.0#Most seconds to wait between two attempts
+	retry_statuses = (500, 502, 503, 504)
+	transient_error_codes = ('10007',)#eBay's "Internal error to the application", sent during brownouts
+	transient_errors = (socket.error, socket.timeout)
+
+	def __init__( self, attempts=None, base_delay=None, max_delay=None, send=None, sleep=None ):
+		'''
+		Args:
+			attempts, base_delay, max_delay: (Optional) Default to the class attributes of the same name
+			send[callable]: (Optional) Sends a request and returns the body of the response,
+			defaults to ebay.executor.send_request()
+			sleep[callable]: (Optional) Waits for a number of seconds, defaults to time.sleep()
+		'''
+		if attempts is not None:
+			self.attempts = attempts
+		if base_delay is not None:
+			self.base_delay = base_delay
+		if max_delay is not None:
+			self.max_delay = max_delay
+		if send is None:
+			from ebay.executor import send_request as send
+		self.send_function = send
+		self.sleep = sleep or time.sleep
+
+	def send( self, request ):
+		'''
+		Send a request until it succeeds, fails for good, or runs out of attempts
+
+		Args:
+			request[EbayApiRequest]: A validated request
+
+		Returns:
+			The body of the response
+		'''
+		if isinstance( request, EbayApiRequest ):
+			self.stamp( request )
+		attempt = 0
+		while True:
+			attempt += 1
+			try:
+				body = self.send_function( request )
+			except Exception as e:
+				if attempt >= self.attempts or not self.is_transient_error( e ):
+					raise
+			else:
+				if attempt >= self.attempts or not self.is_transient_response( body ):
+					return body
+			self.sleep( self.get_delay( attempt ) )
+
+	def stamp( self, request ):
+		'''
+		Give a request the MessageID, and Item UUID, its retries are recognized by
+		'''
+		message_id = request.get_message_id() or request.generate_message_id()
+		if 'uuid' in request.get_validation_plan().accepted_keys and not request.get_data().get( 'uuid' ):
+			request.update( {'uuid': message_id_to_uuid( message_id )} )
+
+	def is_transient_error( self, error ):
+		if isinstance( error, HTTPStatusError ):
+			return error.status in self.retry_statuses
+		return isinstance( error, self.transient_errors ) or isinstance( error, httplib.HTTPException )
+
+	def is_transient_response( self, body ):
+		'''
+		Returns True if the response only failed because of transient eBay errors
+		'''
+		if '<Errors>' not in body or '<Ack>Success</Ack>' in body or '<Ack>Warning</Ack>' in body:
+			return False
+		codes = error_code_pattern.findall( body )
+		return bool( codes ) and all( code in self.transient_error_codes for code in codes )
+
+	def get_delay( self, attempt ):
+		'''
+		Seconds to wait after the given attempt failed, drawn at random up to the
+		exponential backoff( "full jitter") so the workers that failed together
+		don't all retry together
+		'''
+		return random.uniform( 0, min( self.max_delay, self.base_delay * 2 ** (attempt - 1) ) )
+
+
+def message_id_to_uuid( message_id ):
+	'''
+	Returns the Item UUID( 32 hex characters) of a MessageID. Generated MessageIDs
+	already are one, any other MessageID( 'order-42') is hashed into one, so the
+	same MessageID always gives the same UUID.
+	'''
+	if uuid_pattern.match( message_id ):
+		return message_id.upper()
+	if isinstance( message_id, unicode ):
+		message_id = message_id.encode( 'utf-8' )
+	return uuid.uuid5( uuid.UUID( message_id_namespace ), message_id ).hex.upper()
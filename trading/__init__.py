@@ -16,25 +16,109 @@ __email__ = "wes@ridersdiscount.com"
 __date__ = "06/15/2012 11:38:39 AM"
 '''
 This module contains data and functions that are common to all 
+
+The request classes of each call are registered by (call name, api version)
+and their modules are only imported the first time they are used:
+	>>> from ebay import trading
+	>>> AddItemRequest = trading.get( 'AddItem', 747 )
+	
+The request classes can still be imported by name, which loads the latest
+registered version of the call:
+	>>> from ebay.trading import AddItemRequest
 '''
 
 
-import uuid
-import os.path
-from lxml import etree
 import sys
-from ebay import *
+import types
+import importlib
 from __trading import *
 
+registry = {}#Maps (call name, api version) to (module name, class name)
+lazy_names = {}#Maps the names this package exports lazily to (module name, class name)
+
+def register( call_name, version, module_name, class_name ):
+	'''
+	Register the request class of a call. The module is not imported until the class is used.
+	
+	Args:
+		call_name[str]: The name of the eBay api call( 'AddItem')
+		version[int]: The api version the class implements( 747)
+		module_name[str]: The module in ebay.trading that defines the class( 'additem747')
+		class_name[str]: The name of the request class( 'AddItemRequest')
+	'''
+	registry[(call_name, int( version ))] = (module_name, class_name)
+	#The class name always refers to the latest version of the call
+	latest = max( registered_version for registered_call, registered_version in registry if registered_call == call_name )
+	lazy_names[class_name] = registry[(call_name, latest)]
+
+def get( call_name, version=None ):
+	'''
+	Returns the request class of a call, importing its module if needed
+	
+	Args:
+		call_name[str]: The name of the eBay api call( 'AddItem')
+		version[int]: (Optional) The api version, the latest registered version by default
+	'''
+	if version is None:
+		versions = [registered_version for registered_call, registered_version in registry if registered_call == call_name]
+		if not versions:
+			raise UnknownCallError( "No request class is registered for %s" % call_name )
+		version = max( versions )
+	try:
+		module_name, class_name = registry[(call_name, int( version ))]
+	except KeyError:
+		raise UnknownCallError( "No request class is registered for %s version %s" % (call_name, version) )
+	return _load( module_name, class_name )
+
+def versions( call_name ):
+	'''
+	Returns the sorted list of api versions registered for a call
+	'''
+	return sorted( registered_version for registered_call, registered_version in registry if registered_call == call_name )
+
+def _load( module_name, class_name ):
+	module = importlib.import_module( '%s.%s' % (__name__, module_name) )
+	return getattr( module, class_name )
+
+
+class UnknownCallError( Exception ): pass
+
+
+class LazyPackage( types.ModuleType ):
+	'''
+	Replaces this package in sys.modules so the registered request classes
+	can be imported by name without importing every call module up front
+	'''
+	def __getattr__( self, name ):
+		if name not in lazy_names:
+			raise AttributeError( "'module' object has no attribute '%s'" % name )
+		value = _load( *lazy_names[name] )
+		setattr( self, name, value )
+		return value
+
+
 ############################
 #
-#	Import version 747
+#	Register version 747
 #
 ############################
-from additem747 import AddItemRequest
-from enditem747 import EndItemRequest
-from reviseitem747 import ReviseItemRequest
-from relistitem747 import RelistItemRequest
-from getitem747 import GetItemRequest
-from getorders747 import GetOrdersRequest
-from getebaydetails747 import GetEbayDetailsRequest
+register( 'AddItem', 747, 'additem747', 'AddItemRequest' )
+register( 'EndItem', 747, 'enditem747', 'EndItemRequest' )
+register( 'ReviseItem', 747, 'reviseitem747', 'ReviseItemRequest' )
+register( 'RelistItem', 747, 'relistitem747', 'RelistItemRequest' )
+register( 'GetItem', 747, 'getitem747', 'GetItemRequest' )
+
+lazy_names['CatalogIngester'] = ('catalog', 'CatalogIngester')
+lazy_names['CoalescingDispatcher'] = ('coalesce', 'CoalescingDispatcher')
+
+#Star imports export the request classes( loading their modules) and the public
+#names of __trading. The registry helpers stay reachable as trading.get(), trading.versions()...
+__all__ = ['GlobalConfiguration', 'TradingApiRequest', 'RequestFactory', 'UnacceptableKeysError', 'UnknownCallError']
+__all__ += sorted( set( class_name for module_name, class_name in registry.itervalues() ) )
+
+
+_package = LazyPackage( __name__ )
+_package.__dict__.update( sys.modules[__name__].__dict__ )
+#Keep the original module alive, Python clears the globals of a module once it's garbage collected
+_package._module = sys.modules[__name__]
+sys.modules[__name__] = _package
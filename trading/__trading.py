@@ -16,6 +16,7 @@ __email__ = "wes@ridersdiscount.com"
 __date__ = "06/15/2012 11:38:39 AM"
 
 
+import copy
 from ebay import *
 class GlobalConfiguration():
 	'''
@@ -36,10 +37,10 @@ class GlobalConfiguration():
 	@classmethod
 	def set_headers(cls, headers):
 		assert type(headers) == dict
-		missing = set(header_keys) - set(headers.keys())
+		missing = set(cls.header_keys) - set(headers.keys())
 		if(len(missing)):
 			raise ValueError("You are missing these keys from your headers dict: %s" % list(missing))
-		cls.headers = headers
+		cls.headers = dict(headers)#A copy, so later changes to the caller's dict don't reach running requests
 		
 	@classmethod
 	def set_token(cls, credentials):
@@ -48,14 +49,16 @@ class GlobalConfiguration():
 	@classmethod
 	def get_token(cls, token):
 		if token in ['production', 'sandbox']:
-			cls.token= EbayAPIConnection( environment=token ).token
+			cls.token = CredentialsCache.get_token( token, EbayAPIConnection.filename )
 			return cls.token
 		
 	@classmethod
 	def get_headers(cls, environment):
-		#Grab connection headers
-		connection = EbayAPIConnection( None, "trading_api", environment )
-		return connection.headers
+		#Grab connection headers from the cached credentials, of the file EbayAPIConnection is configured with
+		if environment.lower() not in ['production', 'sandbox']:
+			raise IncorrectEnvironmentError( "Incorrect environment, acceptable environments are 'production' or 'sandbox'" )
+		url, location, headers = CredentialsCache.get_connection_info( "trading_api", environment.lower(), EbayAPIConnection.filename )
+		return headers
 
 class TradingApiRequest(EbayApiRequest):
 	'''
@@ -89,6 +92,9 @@ class TradingApiRequest(EbayApiRequest):
 	}
 	environment = 'sandbox' #Which eBay environment to connect to( either 'sandbox' or 'production' )
 	
+	envelope_cache = {}#Serialized envelopes shared by all TradingApi Requests, see _get_envelope()
+	envelope_cache_size = 256#The envelope cache is emptied when it grows past this many envelopes
+	
 	ship_to_locations = ("AA","AD","AE","AF","AG","AI","AL","AM","AN","AO","AQ","AR","AS","AT","AU",
 "AW","AZ","BA","BB","BD","BE","BF","BG","BH","BI","BJ","BM","BN","BO","BR","BS","BT","BV","BW","BY","BZ",
 "CA","CC","CD","CF","CG","CH","CI","CK","CL","CM","CN","CO","CR","CU","CV","CX","CY","CZ","DE","DJ","DK","DM",
@@ -105,12 +111,15 @@ class TradingApiRequest(EbayApiRequest):
 "WillNotShip", "WorldWide")#List of acceptable shiptolocations as well as exclude locations
 	
 	shipping_types = ('Calculated', 'CalculatedDomesticFlatInternational', 'Flat', 'FlatDomesticCalculatedInternational')#List of acceptable values for shipping_types
+	
+	listing_types = ('AdType', 'Chinese', 'CustomCode', 'FixedPriceItem', 'Half', 'LeadGeneration', 'PersonalOffer', 'Shopping', 'Unknown')#List of acceptable values for listing_type
 
 	#A map of all TradingAPI dictionary keys to their XML tag names
 	key_map = {
 		'listing_type': 'ListingType',
 		'picture_details': 'PictureDetails',
 		'picture_url': 'PictureURL',
+		'gallery_url': 'GalleryURL',
 		'subtitle': 'SubTitle',
 		'sku': 'SKU',
 		'uuid': 'UUID',
@@ -229,6 +238,23 @@ class TradingApiRequest(EbayApiRequest):
 
 		EbayApiRequest.__init__( self )
 
+	def _get_envelope(self):
+		'''
+		Returns the serialized envelope of the request from the envelope cache.
+		The envelope( root element, ErrorLanguage, WarningLevel, Version and
+		RequesterCredentials) is the same for every request made with the same
+		account, so it is only escaped and formatted the first time it is used.
+		'''
+		key = (self.call_name, self.api_version, self.error_language, self.warning_level,
+			   self.token, bool(self.message_id))
+		envelope = self.envelope_cache.get(key)
+		if envelope is None:
+			envelope = EbayApiRequest._get_envelope(self)
+			if len(self.envelope_cache) >= self.envelope_cache_size:
+				self.envelope_cache.clear()
+			self.envelope_cache[key] = envelope
+		return envelope
+
 	def set_token(self, token):
 		#print "Type: %s" % type( token )
 		assert type(token) is str
@@ -237,6 +263,9 @@ class TradingApiRequest(EbayApiRequest):
 	def set_header(self, header, value):
 		if(header not in self.headers.keys()):
 			raise Exception("Uknown Header -> %s" % header)
+		if 'headers' not in self.__dict__:
+			#Copy the class's headers on the first write, so requests never share a headers dict
+			self.headers = dict(self.headers)
 		self.headers[header] = value
 		
 	def set_headers(self, headers):
@@ -248,6 +277,62 @@ class TradingApiRequest(EbayApiRequest):
 		return self.headers
 
 
+class RequestFactory():
+	'''
+	Creates requests of a single TradingApi Request class cheaply.
+	
+	Creating a request normally resolves the headers and token from the
+	GlobalConfiguration and formats its help string. The factory does that
+	once for a prototype request, and every request it creates afterwards is
+	a copy of the prototype with its own headers and empty data.
+	
+		factory = RequestFactory( EndItemRequest, token='production' )
+		for item_id in item_ids:
+			request = factory.create( {'item_id': item_id, 'ending_reason': 'NotAvailable'} )
+	'''
+	
+	def __init__(self, request_class, headers=None, token=None):
+		'''
+		Args:
+			request_class[class]: The TradingApiRequest subclass to create requests of
+			headers, token: Passed to the constructor of the prototype request, see TradingApiRequest
+		'''
+		self.request_class = request_class
+		self.prototype = request_class(headers, token)
+		
+	def create(self, data=None):
+		'''
+		Returns a new request with the prototype's configuration
+		
+		Args:
+			data[dict]: (Optional) The request data to pass to update()
+		'''
+		request = copy.copy(self.prototype)
+		self._copy_containers(request)
+		if data is not None:
+			request.update(data)
+		return request
+		
+	def reset(self, request):
+		'''
+		Return a request created by this factory to the prototype's state so it
+		can be reused for another request
+		'''
+		request.__dict__.clear()
+		request.__dict__.update(self.prototype.__dict__)
+		self._copy_containers(request)
+		
+	def _copy_containers(self, request):
+		'''
+		copy.copy() shares the prototype's dicts, give the request its own
+		headers and data. reset() then replaces everything built from the data.
+		'''
+		if isinstance(request.headers, dict):
+			request.headers = dict(request.headers)
+		request.data = dict(request.data or {})
+		request.reset()
+		
+
 class UnacceptableKeysError(Exception): pass
 
 
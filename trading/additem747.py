@@ -115,6 +115,33 @@ Basic structure:
 			print "String is not TitleCased"
 		return True
 		
+	def _validate_column_title(self, indexes, titles):
+		'''
+		Validates a column of Item.Title values for validate_many()
+		'''
+		errors = {}
+		for index, title in zip(indexes, titles):
+			if(not isinstance(title, basestring)):
+				errors[index] = InvalidFieldType("'title' must be an instance of basestring")
+			elif(not title.strip()):
+				errors[index] = EmptyRequiredField("'title' cannot be empty!")
+			elif(len(title) > 80):
+				errors[index] = InvalidFieldLength("title must be no more than 80 characters in length")
+		return errors
+
+	def _validate_listing_type(self, listing_type):
+		'''
+		Validates Item.ListingType
+		'''
+		if(listing_type not in self.listing_types):
+			raise InvalidListingType("Invalid Listing Type: listing_type must be one of: %s" % list(self.listing_types))
+
+	def _validate_column_listing_type(self, indexes, listing_types):
+		'''
+		Validates a column of Item.ListingType values for validate_many()
+		'''
+		return self._validate_column_choices(indexes, listing_types, self.listing_types, InvalidListingType)
+
 	def _validate_primary_category(self, category):
 		'''
 		Validates Item.PrimaryCategory
@@ -137,6 +164,71 @@ Basic structure:
 			'exclude_ship_to_locations':[''*x],
 		}
 		'''
+		ship_to_locations, exclude_locations = self._validate_shipping_structure( shipping_details )
+		
+		#Check that the international ship to locations are acceptable
+		unacceptable = set( ship_to_locations ).difference( self.ship_to_locations )
+		if len( unacceptable):
+			raise UnacceptableLocationsError("%s are not acceptable ship_to_location's" % list( unacceptable))
+
+		#Check that shipping type is correct
+		if shipping_details['shipping_type'] not in self.shipping_types:
+			raise InvalidShippingType("Invalid Shipping Type specified in shipping_details. Acceptable values are: %s" % list( self.shipping_types) )
+		
+		#Check that exclude locations is correct
+		unacceptable = set( exclude_locations ).difference( self.ship_to_locations )
+		if len( unacceptable):
+			raise InvalidLocationsError( "%s are not acceptable exclude_ship_to_location's" % list( unacceptable ) )
+
+	def _validate_column_shipping_details( self, indexes, values ):
+		'''
+		Validates a column of shipping_details structures for validate_many()
+		The structure of each value is validated on its own, the shipping types
+		and locations are validated for the whole column at once
+		'''
+		errors = {}
+		valid_indexes = []
+		shipping_types = []
+		locations = []#(ship to locations, exclude locations) of each valid row
+		for index, shipping_details in zip( indexes, values ):
+			try:
+				locations.append( self._validate_shipping_structure( shipping_details ) )
+			except Exception as e:
+				errors[index] = e
+			else:
+				valid_indexes.append( index )
+				shipping_types.append( shipping_details['shipping_type'] )
+		
+		#Collect every location used in the column and check them in one go
+		ship_to_locations = set()
+		exclude_locations = set()
+		for ship_to, exclude in locations:
+			ship_to_locations.update( ship_to )
+			exclude_locations.update( exclude )
+		unacceptable_ship_to = ship_to_locations.difference( self.ship_to_locations )
+		unacceptable_exclude = exclude_locations.difference( self.ship_to_locations )
+		if unacceptable_ship_to or unacceptable_exclude:
+			for index, (ship_to, exclude) in zip( valid_indexes, locations ):
+				unacceptable = unacceptable_ship_to.intersection( ship_to )
+				if unacceptable:
+					errors[index] = UnacceptableLocationsError("%s are not acceptable ship_to_location's" % list( unacceptable))
+					continue
+				unacceptable = unacceptable_exclude.intersection( exclude )
+				if unacceptable:
+					errors[index] = InvalidLocationsError( "%s are not acceptable exclude_ship_to_location's" % list( unacceptable ) )
+		
+		for index, error in self._validate_column_choices( valid_indexes, shipping_types, self.shipping_types, InvalidShippingType ).iteritems():
+			errors.setdefault( index, error )
+		return errors
+
+	def _validate_shipping_structure( self, shipping_details ):
+		'''
+		Validates the structure of shipping_details, without checking the
+		shipping type and locations against their acceptable values
+		
+		Returns:
+			A tuple of lists (ship to locations, exclude ship to locations) used by shipping_details
+		'''
 		required_keys = set(['shipping_type', 'shipping_service_options'])
 		accepted_keys = required_keys | set( ['international_shipping_service_option', 'exclude_ship_to_location'] )
 		#Ensure shipping_details is a dict
@@ -195,6 +287,7 @@ Basic structure:
 			raise InvalidShippingServiceOption( "shipping_service_options must be of type dict or list(of dicts)" )
 	
 		#Check for zero to 5 international shipping services
+		ship_to_locations = []
 		international = None
 		if 'international_shipping_service_option' in shipping_details.keys():
 			international = shipping_details['international_shipping_service_option']
@@ -227,35 +320,21 @@ Basic structure:
 						option['ship_to_location'] = [option['ship_to_location']]
 						
 					if isinstance( option['ship_to_location'], list):
-						#Check if acceptable options
-						unacceptable = set(option['ship_to_location']) - set( self.ship_to_locations )
-						if len( unacceptable):
-							raise UnacceptableLocationsError("%s are not acceptable ship_to_location's" % list( unacceptable))
+						ship_to_locations.extend( option['ship_to_location'] )
 			else:
 				#shipping_service_options must be either a dict or a list, raise error
 				raise InvalidShippingServiceOption( "international_shipping_service_option must be of type dict or list(of dicts)" )
 
-		#Check that shipping type is correct
-		if shipping_details['shipping_type'] not in self.shipping_types:
-			raise InvalidShippingType("Invalid Shipping Type specified in shipping_details. Acceptable values are: %s" % list( self.shipping_types) )
-		
 		#Check that exclude locations is correct
-		try:
-			exclude_locations = shipping_details['exclude_ship_to_location']
-		except KeyError:
-			exclude_locations = None
+		exclude_locations = shipping_details.get( 'exclude_ship_to_location' )
+		if not exclude_locations:
+			exclude_locations = []
+		elif isinstance( exclude_locations, basestring ):
+			exclude_locations = [exclude_locations]
+		elif not isinstance( exclude_locations, list ):
+			raise InvalidShippingServiceOption( "exclude_ship_to_location must be either a string or a list of strings")
 		
-		if exclude_locations:
-			if isinstance( exclude_locations, basestring ):
-				exclude_locations = list( exclude_locations )
-				
-			if isinstance( exclude_locations, list ):
-				unacceptable = set( exclude_locations ) - set( self.ship_to_locations )
-				if len( unacceptable):
-					raise InvalidLocationsError( "%s are not acceptable exclude_ship_to_location's" % list( unacceptable ) )
-				
-			else:
-				raise InvalidShippingServiceOption( "exclude_ship_to_location must be either a string or a list of strings")
+		return ship_to_locations, exclude_locations
 
 class EmptyRequiredField( Exception ): pass
 class InvalidFieldType( Exception ): pass
@@ -264,6 +343,10 @@ class InvalidCategoryStructure( Exception ): pass
 class InvalidShippingServiceOption( Exception ): pass
 class UnacceptableKeysError( Exception ): pass
 class InvalidLocationsError( Exception ): pass
+class UnacceptableLocationsError( Exception ): pass
+class InvalidShippingType( Exception ): pass
+class InvalidListingType( Exception ): pass
+class MissingRequiredKeys( Exception ): pass
 
 
 
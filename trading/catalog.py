@@ -0,0 +1,286 @@
+#    This module is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.#
+#
+#    This module is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Wesley Hansen"
+__email__ = "wes@ridersdiscount.com"
+__date__ = "06/15/2012 11:38:39 AM"
+'''
+Turns the rows of a catalog table into serialized TradingApi Requests
+without building a nested data dict for every row
+'''
+
+from ebay.trading.__trading import *
+from ebay import escape_text, InvalidRequest
+
+
+class CatalogIngester():
+	'''
+	Streams the rows of a catalog table( csv.reader rows, tuples, NumPy rows...)
+	straight into serialized requests of the same type as the given request.
+
+	Each column of the table is named by its dotted key path, the same way
+	keys are passed to update():
+		['title', 'primary_category.category_id', 'start_price', ...]
+
+	A numbered part repeats a container, so several shipping services can
+	be given in one row:
+		['shipping_details.shipping_service_options.0.shipping_service',
+		 'shipping_details.shipping_service_options.1.shipping_service', ...]
+
+	Several columns with the same path create an element for each value(
+	'payment_methods' three times creates three <PaymentMethods>)
+	Empty cells( None or '') are left out of the request.
+
+	The column paths are resolved against the key_map once, when the
+	ingester is created. Rows are processed chunk_size at a time, so memory
+	stays bounded no matter how large the table is.
+
+	Example:
+		reader = csv.reader( open( 'catalog.csv' ) )
+		ingester = CatalogIngester( AddItemRequest( False, False ), reader.next() )
+		report = ingester.write_bulk( bulk_file, reader )
+	'''
+	chunk_size = 1000#Number of rows validated together, see EbayApiRequest.validate_columns()
+
+	def __init__( self, request, columns, validate=True ):
+		'''
+		Args:
+			request[TradingApiRequest]: Every row is serialized as a request of this type
+			with this request's envelope( token, ErrorLanguage...)
+			columns[list]: The dotted key path of each column of the table
+			validate[bool]: (Optional) False to skip validating the rows
+		'''
+		if not isinstance( request, TradingApiRequest ):
+			raise ValueError( "request must be a TradingApiRequest, not a %r" % request )
+		self.request = request
+		self.columns = list( columns )
+		self.validate = validate
+		self.root = self._compile( self.columns )
+
+	def _compile( self, columns ):
+		'''
+		Resolve the column paths into a tree of CatalogNodes
+		'''
+		key_map = self.request.key_map
+		accepted_keys = self.request.get_validation_plan().accepted_keys
+		root = CatalogNode( None, None )
+		for index, column in enumerate( columns ):
+			parts = column.split( '.' )
+			if parts[0] not in accepted_keys:
+				raise InvalidRequest( "Column %s is not an acceptable key for %s" % (column, self.request.request_name) )
+			node = root
+			for part in parts:
+				if part.isdigit():
+					node = node.get_repeat( int( part ), column )
+				else:
+					if part not in key_map:
+						raise InvalidRequest( "Column %s has a key that isn't in the key_map: %s" % (column, part) )
+					node = node.get_child( part, key_map[part], column )
+			node.add_column( index, column )
+		root.finish()
+		return root
+
+	def iter_requests( self, rows ):
+		'''
+		Serialize each row of the table into a request
+
+		Args:
+			rows[iterable]: The rows of the table, each a sequence with a value for every column
+
+		Yields:
+			(row index, xml string, None) for each valid row and
+			(row index, None, {key: exception}) for each row that failed validation
+		'''
+		chunk = []
+		offset = 0
+		for row in rows:
+			chunk.append( row )
+			if len( chunk ) >= self.chunk_size:
+				for result in self._process_chunk( chunk, offset ):
+					yield result
+				offset += len( chunk )
+				chunk = []
+		if chunk:
+			for result in self._process_chunk( chunk, offset ):
+				yield result
+
+	def write_bulk( self, bulk_file, rows ):
+		'''
+		Serialize each row of the table and write it to a BulkDataFile
+
+		Args:
+			bulk_file[BulkDataFile]: An open BulkDataFile of the same call type as the request
+			rows[iterable]: The rows of the table
+
+		Returns:
+			A dict mapping the index of each row that failed validation to a
+			dict of {key: exception}. These rows were not written.
+		'''
+		if bulk_file.container_request_type != self.request.call_name:
+			raise ValueError( "CallType must equal the call type of the BulkDataFile - '%s'" % bulk_file.container_request_type )
+		report = {}
+		for index, xml, errors in self.iter_requests( rows ):
+			if errors:
+				report[index] = errors
+			else:
+				bulk_file.write( xml + "\n" )
+		return report
+
+	def serialize_row( self, row ):
+		'''
+		Returns the xml string of the request for a single row, without validating it
+		'''
+		request = self.request
+		parts = []
+		write = parts.append
+		head, tail, foot = request._get_envelope()
+		write( head )
+		if request.message_id:
+			write( '<MessageID>%s</MessageID>' % escape_text( request.message_id ) )
+			write( tail )
+		if request.call_name in request.has_item_container:
+			write( '<Item>' )
+			self.root.write_children( write, row )
+			write( '</Item>' )
+		else:
+			self.root.write_children( write, row )
+		write( foot )
+		return ''.join( parts )
+
+	def _process_chunk( self, chunk, offset ):
+		if self.validate:
+			report = self._validate_chunk( chunk )
+		else:
+			report = {}
+		for index, row in enumerate( chunk ):
+			errors = report.get( index )
+			if errors:
+				yield (offset + index, None, errors)
+			else:
+				yield (offset + index, self.serialize_row( row ), None)
+
+	def _validate_chunk( self, chunk ):
+		'''
+		Validate a chunk of rows column by column. Nested values are only
+		assembled for the top-level keys that have a validator.
+		'''
+		plan = self.request.get_validation_plan()
+		columns = {}
+		for node in self.root.children:
+			indexes = []
+			values = []
+			has_validator = node.key in plan.validators or node.key in plan.column_validators
+			for index, row in enumerate( chunk ):
+				if node.has_values( row ):
+					indexes.append( index )
+					if has_validator:
+						values.append( node.get_value( row ) )
+			if not has_validator:
+				values = [None] * len( indexes )
+			columns[node.key] = (indexes, values)
+		return self.request.validate_columns( columns, len( chunk ) )
+
+
+class CatalogNode():
+	'''
+	One key of the column paths of a CatalogIngester. A node is either a leaf
+	holding the columns its values come from, a container of child nodes,
+	or a repeated container holding numbered containers.
+	'''
+
+	def __init__( self, key, tag ):
+		self.key = key
+		self.tag = tag
+		self.start_tag = '<%s>' % tag
+		self.end_tag = '</%s>' % tag
+		self.children = []
+		self.child_nodes = {}
+		self.repeats = {}
+		self.columns = []
+		self.all_columns = ()#Every column of this node and the nodes under it
+
+	def get_child( self, key, tag, column ):
+		if self.columns or self.repeats:
+			raise InvalidRequest( "Column %s nests a key under a value or a numbered container" % column )
+		node = self.child_nodes.get( key )
+		if node is None:
+			node = self.child_nodes[key] = CatalogNode( key, tag )
+			self.children.append( node )
+		return node
+
+	def get_repeat( self, number, column ):
+		if self.columns or self.children or self.key is None:
+			raise InvalidRequest( "Column %s numbers a key that isn't a container" % column )
+		node = self.repeats.get( number )
+		if node is None:
+			node = self.repeats[number] = CatalogNode( self.key, self.tag )
+		return node
+
+	def add_column( self, index, column ):
+		if self.children or self.repeats:
+			raise InvalidRequest( "Column %s gives a value to a container" % column )
+		self.columns.append( index )
+
+	def finish( self ):
+		'''
+		Order the numbered containers and collect the columns under each node
+		'''
+		self.repeats = [self.repeats[number] for number in sorted( self.repeats )]
+		all_columns = list( self.columns )
+		for node in self.children + self.repeats:
+			node.finish()
+			all_columns.extend( node.all_columns )
+		self.all_columns = tuple( all_columns )
+
+	def has_values( self, row ):
+		for index in self.all_columns:
+			value = row[index]
+			if value is not None and value != '':
+				return True
+		return False
+
+	def write_children( self, write, row ):
+		for node in self.children:
+			node.write( write, row )
+
+	def write( self, write, row ):
+		if self.columns:
+			for index in self.columns:
+				value = row[index]
+				if value is None or value == '':
+					continue
+				if isinstance( value, basestring ):
+					write( self.start_tag + escape_text( value ) + self.end_tag )
+				else:
+					write( self.start_tag + str( value ) + self.end_tag )
+		elif self.repeats:
+			for node in self.repeats:
+				node.write( write, row )
+		elif self.has_values( row ):
+			write( self.start_tag )
+			self.write_children( write, row )
+			write( self.end_tag )
+
+	def get_value( self, row ):
+		'''
+		Returns the value of this node as update() would receive it
+		'''
+		if self.columns:
+			values = [row[index] for index in self.columns if row[index] is not None and row[index] != '']
+			if len( self.columns ) == 1:
+				return values[0] if values else None
+			return values
+		elif self.repeats:
+			return [node.get_value( row ) for node in self.repeats if node.has_values( row )]
+		else:
+			return dict( (node.key, node.get_value( row )) for node in self.children if node.has_values( row ) )
@@ -0,0 +1,277 @@
+#    This module is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.#
+#
+#    This module is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Wesley Hansen"
+__email__ = "wes@ridersdiscount.com"
+__date__ = "06/15/2012 11:38:39 AM"
+'''
+Coalesces the ReviseItem requests several producers send for the same listing
+'''
+
+import copy
+import heapq
+import threading
+import time
+import Queue
+from ebay.trading.__trading import *
+from ebay import merge_dicts
+from ebay.futures import Future
+from ebay.executor import send_request, execute_many
+
+
+class CoalescingDispatcher():
+	'''
+	Holds the ReviseItem requests for each ItemID for a window of time and
+	sends them as a single request.
+
+	The first request for an ItemID opens its window. Every request submitted
+	for that ItemID until the window closes is merged into it, later requests
+	winning: their <Item> fields are merged key by key over the earlier ones,
+	and a field one request sets and another deletes ends up the way the
+	later request has it. The merged request uses the envelope( token,
+	headers...) of the last request submitted.
+
+	Every submitter gets a Future that resolves to the result of the single
+	request sent for the window:
+
+		dispatcher = CoalescingDispatcher( window=2.0 )
+		price = dispatcher.submit( price_request )
+		stock = dispatcher.submit( stock_request )
+		price.result() == stock.result()#One ReviseItem call was made
+
+	The dispatcher's thread closes the windows as their time is up, and hands
+	the merged requests to execute_many(), so up to workers of them are in
+	flight at once. Each is sent through send( request) which returns the
+	result the futures resolve to.
+	'''
+	window = 2.0#Seconds the requests for an ItemID are held before they are sent
+	workers = 4#Most merged requests sent at once
+
+	def __init__( self, window=None, send=None, workers=None ):
+		'''
+		Args:
+			window[float]: (Optional) Seconds to hold the requests for an ItemID, defaults to the class's window
+			send[callable]: (Optional) Sends a request and returns its result,
+			defaults to sending it over an EbayAPIConnection and returning the body of the response
+			workers[int]: (Optional) Most merged requests sent at once, defaults to the class's workers
+		'''
+		if window is not None:
+			self.window = window
+		if workers is not None:
+			self.workers = workers
+		self.send = send or send_request
+		self.condition = threading.Condition()
+		self.batches = {}#Maps each ItemID to the CoalescedBatch of its open window
+		self.deadlines = []#Heap of (deadline, ItemID, CoalescedBatch) of the open windows
+		self.ready = Queue.Queue()#The batches whose window closed, waiting for a worker, then None once closed
+		self.thread = None
+		self.sender = None
+		self.closed = False
+
+	def submit( self, request ):
+		'''
+		Hold a ReviseItem request until the window of its ItemID closes
+
+		Args:
+			request[TradingApiRequest]: A validated request with an 'item' container holding an 'item_id'
+
+		Returns:
+			A Future of the result of the request the window is sent as
+		'''
+		if not isinstance( request, TradingApiRequest ):
+			raise InvalidRequestError( "request must be a TradingApiRequest" )
+		if not request.validated:
+			raise DataNotValidatedError( "Data Not Validated: Validate the data by calling update()" )
+		item = request.get_data().get( 'item' )
+		if not isinstance( item, dict ) or 'item_id' not in item:
+			raise InvalidRequest( "Only requests with an 'item' container holding an 'item_id' can be coalesced" )
+
+		future = Future()
+		item_id = item['item_id']
+		with self.condition:
+			if self.closed:
+				raise DispatcherClosed( "The dispatcher has been closed" )
+			batch = self.batches.get( item_id )
+			if batch is not None and batch.request.call_name != request.call_name:
+				#A different call for the same listing, send what was held right away
+				del self.batches[item_id]
+				heapq.heappush( self.deadlines, (0, item_id, batch) )
+				batch = None
+			if batch is None:
+				batch = self.batches[item_id] = CoalescedBatch( item_id )
+				heapq.heappush( self.deadlines, (time.time() + self.window, item_id, batch) )
+				self._start_thread()
+				self.condition.notify()
+			batch.add( request, future )
+		return future
+
+	def flush( self ):
+		'''
+		Close every open window now, and wait until their requests have been sent
+		'''
+		with self.condition:
+			batches = [batch for batch in self.batches.itervalues() if not batch.sent]
+			for batch in batches:
+				batch.sent = True
+			self.batches = {}
+			if batches:
+				self._start_thread()
+		for batch in batches:
+			self.ready.put( batch )
+		for batch in batches:
+			batch.done.wait()
+
+	def close( self ):
+		'''
+		Send the requests that are held and stop the dispatcher's threads
+		'''
+		with self.condition:
+			self.closed = True
+			self.condition.notify()
+		if self.thread is not None:
+			self.thread.join()
+		self.flush()
+		if self.sender is not None:
+			self.ready.put( None )
+			self.sender.join()
+
+	def _start_thread( self ):
+		if self.thread is None:
+			self.thread = threading.Thread( target=self._run, name="CoalescingDispatcher" )
+			self.thread.daemon = True
+			self.thread.start()
+			self.sender = threading.Thread( target=self._send_ready, name="CoalescingDispatcher-send" )
+			self.sender.daemon = True
+			self.sender.start()
+
+	def _send_ready( self ):
+		'''
+		Feed the batches whose window closed to execute_many() until close()
+		'''
+		batches = iter( self.ready.get, None )
+		for index, result, error in execute_many( batches, workers=self.workers, ordered=False, send=self._dispatch, max_pending=self.workers ):
+			pass#_dispatch() resolved the futures of the batch
+
+	def _run( self ):
+		while True:
+			ready = []
+			with self.condition:
+				while not ready:
+					if self.closed:
+						return
+					now = time.time()
+					while self.deadlines and self.deadlines[0][0] <= now:
+						deadline, item_id, batch = heapq.heappop( self.deadlines )
+						if self.batches.get( item_id ) is batch:
+							del self.batches[item_id]
+						if not batch.sent:
+							batch.sent = True
+							ready.append( batch )
+					if not ready:
+						self.condition.wait( self.deadlines[0][0] - now if self.deadlines else None )
+			for batch in ready:
+				self.ready.put( batch )
+
+	def _dispatch( self, batch ):
+		try:
+			result = self.send( batch.build() )
+		except Exception:
+			for future in batch.futures:
+				future.set_exc_info()
+		else:
+			for future in batch.futures:
+				future.set_result( result )
+		finally:
+			batch.done.set()
+
+
+class CoalescedBatch():
+	'''
+	The requests submitted for one ItemID during one window, merged into the
+	data of a single request
+	'''
+
+	def __init__( self, item_id ):
+		self.item_id = item_id
+		self.request = None#The last request submitted, its envelope is used
+		self.item = {}
+		self.deleted = []#The DeletedFields, in the order they were first deleted
+		self.futures = []
+		self.sent = False#True once a thread has taken the batch to send it
+		self.done = threading.Event()#Set once its futures are resolved
+		self.tag_keys = None
+
+	def add( self, request, future ):
+		self.request = request
+		self.futures.append( future )
+		if self.tag_keys is None:
+			self.tag_keys = dict( (tag, key) for key, tag in request.key_map.iteritems() )
+
+		data = request.get_data()
+		item = data['item']
+		deleted = data.get( 'deleted_field' ) or []
+		if isinstance( deleted, basestring ):
+			deleted = [deleted]
+
+		#A field this request sets is no longer deleted
+		self.deleted = [field for field in self.deleted if not has_path( item, self._field_keys( field ) )]
+		self.item = merge_dicts( self.item, item )
+		#And a field it deletes is no longer set
+		for field in deleted:
+			self.item = without_path( self.item, self._field_keys( field ) )
+			if field not in self.deleted:
+				self.deleted.append( field )
+
+	def build( self ):
+		'''
+		Returns the merged request
+		'''
+		request = copy.copy( self.request )
+		request.reset()
+		data = {'item': self.item}
+		if self.deleted:
+			data['deleted_field'] = list( self.deleted )
+		request.update( data )
+		return request
+
+	def _field_keys( self, field ):
+		'''
+		Turn a DeletedField( Item.PictureDetails.GalleryURL) into the keys of its
+		value in the item dict: ['picture_details', 'gallery_url']
+		'''
+		tags = field.split( '.' )[1:]
+		return [self.tag_keys.get( tag, tag ) for tag in tags]
+
+
+def has_path( data, keys ):
+	for key in keys:
+		if not isinstance( data, dict ) or key not in data:
+			return False
+		data = data[key]
+	return True
+
+def without_path( data, keys ):
+	'''
+	Returns data without the value at keys, only the dicts along the path are copied
+	'''
+	if not has_path( data, keys ):
+		return data
+	data = dict( data )
+	if len( keys ) == 1:
+		del data[keys[0]]
+	else:
+		data[keys[0]] = without_path( data[keys[0]], keys[1:] )
+	return data
+
+
+class DispatcherClosed( Exception ): pass
@@ -34,6 +34,8 @@ class EndItemRequest(TradingApiRequest):
 	required_keys = ('item_id', 'ending_reason')
 	other_keys = ()
 	
+	ending_reasons = ('Incorrect', 'LostOrBroken', 'NotAvailable', 'OtherListingError', 'SellToHighBidder')#List of acceptable values for ending_reason
+	
 	def __init__( self, *args ):
 		self.call_name = 'EndItem'
 		self.request_name = 'EndItemRequest'
@@ -66,13 +68,17 @@ Basic structure:
 			reason[str]: The value at key 'ending_reason' in the data structure
 		'''
 
-		accepted_reasons = ('Incorrect', 'LostOrBroken', 'NotAvailable', 'OtherListingError', 'SellToHighBidder')
-		
 		if not isinstance( reason, basestring ):
 			raise InvalidReasonError( "Invalid Ending Reason: must be an instance of basestring, not a %s" % type(reason) )
 		
-		if reason not in accepted_reasons:
-			raise InvalidReasonError( "Invalid Ending Reason: ending_reason must be one of: %s",list(accepted_reasons)) 
+		if reason not in self.ending_reasons:
+			raise InvalidReasonError( "Invalid Ending Reason: ending_reason must be one of: %s" % list(self.ending_reasons)) 
+
+	def _validate_column_ending_reason( self, indexes, reasons ):
+		'''
+		Validates a column of ending_reason values for validate_many()
+		'''
+		return self._validate_column_choices( indexes, reasons, self.ending_reasons, InvalidReasonError )
 
 
 class InvalidReasonError( Exception ): pass
@@ -0,0 +1,341 @@
+#    This module is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.#
+#
+#    This module is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Wesley Hansen"
+__email__ = "wes@ridersdiscount.com"
+__date__ = "06/15/2012 11:38:39 AM"
+'''
+Generates TradingApi request classes from eBay's eBLBaseComponents schema
+
+This is an offline tool, run it against a local copy of the schema( the
+ebaySvc.xsd that eBay publishes for each version of the Trading API):
+
+	python -m ebay.trading.generate ebaySvc.xsd 747 output/ AddItem ReviseItem GetItem
+
+It writes one module per call, following the name-version scheme
+( output/additem747.py, ...). Each module holds the request class along with:
+	-The key_map entries of every field the call can use
+	-A frozenset of the acceptable values of every enum the call uses
+	-A type table of every complex type the call uses, which the generated
+	_validate_<key> methods check the data against( see ebay.trading.schema)
+
+Register the generated classes like any other call, see implementing_api.txt
+'''
+
+import os
+import re
+import sys
+from lxml import etree
+from ebay.trading.__trading import TradingApiRequest
+from ebay.trading import schema
+
+XS = '{http://www.w3.org/2001/XMLSchema}'
+
+#Maps the built-in xml schema types to the kind of value schema checks them as
+builtin_kinds = {
+	'string': schema.STRING,
+	'token': schema.STRING,
+	'normalizedString': schema.STRING,
+	'anyURI': schema.STRING,
+	'base64Binary': schema.STRING,
+	'duration': schema.STRING,
+	'time': schema.STRING,
+	'date': schema.DATETIME,
+	'dateTime': schema.DATETIME,
+	'int': schema.INTEGER,
+	'integer': schema.INTEGER,
+	'long': schema.INTEGER,
+	'short': schema.INTEGER,
+	'byte': schema.INTEGER,
+	'nonNegativeInteger': schema.INTEGER,
+	'positiveInteger': schema.INTEGER,
+	'double': schema.DOUBLE,
+	'float': schema.DOUBLE,
+	'decimal': schema.DOUBLE,
+	'boolean': schema.BOOLEAN,
+	'anyType': schema.ANY,
+}
+
+kind_names = {
+	schema.STRING: 'STRING',
+	schema.INTEGER: 'INTEGER',
+	schema.DOUBLE: 'DOUBLE',
+	schema.BOOLEAN: 'BOOLEAN',
+	schema.DATETIME: 'DATETIME',
+	schema.ENUM: 'ENUM',
+	schema.COMPLEX: 'COMPLEX',
+	schema.ANY: 'ANY',
+}
+
+abstract_types = ('AbstractRequestType',)#Base types whose fields are part of the envelope, not the request data
+
+
+def local_name( name ):
+	'''
+	Strip the namespace prefix off of a type reference( 'ns:ItemType' --> 'ItemType')
+	'''
+	return name.rpartition( ':' )[2]
+
+def key_for_tag( tag ):
+	'''
+	Derive a key_map key from an xml tag, following the key naming rules:
+		ItemID --> item_id, PayPalEmailAddress --> pay_pal_email_address
+	'''
+	key = re.sub( r'([A-Z]+)([A-Z][a-z])', r'\1_\2', tag )
+	key = re.sub( r'([a-z0-9])([A-Z])', r'\1_\2', key )
+	return key.lower()
+
+
+class SchemaReader():
+	'''
+	Reads the named types and elements of an xml schema file
+	'''
+
+	def __init__( self, path ):
+		root = etree.parse( path ).getroot()
+		self.complex_types = {}
+		self.simple_types = {}
+		self.elements = {}
+		for child in root:
+			name = child.get( 'name' )
+			if child.tag == XS + 'complexType':
+				self.complex_types[name] = child
+			elif child.tag == XS + 'simpleType':
+				self.simple_types[name] = child
+			elif child.tag == XS + 'element':
+				self.elements[name] = local_name( child.get( 'type', 'anyType' ) )
+
+	def resolve( self, type_name ):
+		'''
+		Returns a tuple (kind, type name) for a type, where type name is the
+		name of the enum or complex type, or None for simple values
+		'''
+		if type_name in self.complex_types:
+			content = self.complex_types[type_name].find( XS + 'simpleContent' )
+			if content is not None:
+				#A simple value with attributes( AmountType...), only the value is supported
+				derivation = content[0]
+				return self.resolve( local_name( derivation.get( 'base' ) ) )
+			return (schema.COMPLEX, type_name)
+		if type_name in self.simple_types:
+			restriction = self.simple_types[type_name].find( XS + 'restriction' )
+			if restriction is None:
+				#xs:list and xs:union
+				return (schema.STRING, None)
+			if restriction.find( XS + 'enumeration' ) is not None:
+				return (schema.ENUM, type_name)
+			return self.resolve( local_name( restriction.get( 'base' ) ) )
+		if type_name in builtin_kinds:
+			return (builtin_kinds[type_name], None)
+		raise GeneratorError( "Unknown type %s" % type_name )
+
+	def enumeration( self, type_name ):
+		'''
+		Returns the sorted acceptable values of an enum type
+		'''
+		restriction = self.simple_types[type_name].find( XS + 'restriction' )
+		return sorted( set( value.get( 'value' ) for value in restriction.findall( XS + 'enumeration' ) ) )
+
+	def fields( self, type_name ):
+		'''
+		Returns a list of (tag, type name, repeated, required) for each child
+		element of a complex type, including the ones of the types it extends
+		'''
+		fields = []
+		self._collect_fields( self.complex_types[type_name], fields )
+		return fields
+
+	def _collect_fields( self, element, fields ):
+		for child in element:
+			if child.tag in (XS + 'sequence', XS + 'choice', XS + 'all'):
+				self._collect_fields( child, fields )
+			elif child.tag == XS + 'complexContent':
+				for derivation in child:
+					if derivation.tag == XS + 'extension':
+						base = local_name( derivation.get( 'base' ) )
+						if base not in abstract_types:
+							fields.extend( self.fields( base ) )
+					self._collect_fields( derivation, fields )
+			elif child.tag == XS + 'element':
+				if child.get( 'ref' ):
+					tag = local_name( child.get( 'ref' ) )
+					type_name = self.elements.get( tag, 'anyType' )
+				else:
+					tag = child.get( 'name' )
+					type_name = local_name( child.get( 'type', 'anyType' ) )
+				max_occurs = child.get( 'maxOccurs', '1' )
+				repeated = max_occurs == 'unbounded' or int( max_occurs ) > 1
+				required = child.get( 'minOccurs', '1' ) != '0'
+				fields.append( (tag, type_name, repeated, required) )
+
+
+class RequestGenerator():
+	'''
+	Generates the module of a request class for each call
+	'''
+
+	def __init__( self, reader, version, schema_name='eBLBaseComponents' ):
+		'''
+		Args:
+			reader[SchemaReader]: The schema to generate from
+			version[str]: The api version of the schema
+			schema_name[str]: (Optional) The name of the schema, used in docstrings
+		'''
+		self.reader = reader
+		self.version = str( version )
+		self.schema_name = schema_name
+		#Reuse the keys of the hand-written key_map, so generated and hand-written calls agree
+		self.known_keys = dict( (tag, key) for key, tag in TradingApiRequest.key_map.iteritems() )
+
+	def key_for_tag( self, tag, key_map ):
+		key = self.known_keys.get( tag ) or key_for_tag( tag )
+		if key_map.get( key, tag ) != tag or TradingApiRequest.key_map.get( key, tag ) != tag:
+			raise GeneratorError( "Tags %s and %s both map to the key %s" % (tag, key_map.get( key ) or TradingApiRequest.key_map[key], key) )
+		key_map[key] = tag
+		return key
+
+	def generate( self, call_name ):
+		'''
+		Returns the source code of the module for call_name
+		'''
+		request_type = '%sRequestType' % call_name
+		if request_type not in self.reader.complex_types:
+			raise GeneratorError( "The schema has no %s" % request_type )
+
+		key_map = {}
+		types = {}
+		enums = {}
+		#Walk every complex type reachable from the request type
+		pending = [request_type]
+		while pending:
+			type_name = pending.pop()
+			if type_name in types:
+				continue
+			fields = types[type_name] = {}
+			for tag, field_type, repeated, required in self.reader.fields( type_name ):
+				kind, name = self.reader.resolve( field_type )
+				key = self.key_for_tag( tag, key_map )
+				fields[key] = (kind, name, repeated, required)
+				if kind == schema.COMPLEX:
+					pending.append( name )
+				elif kind == schema.ENUM and name not in enums:
+					enums[name] = self.reader.enumeration( name )
+
+		request_fields = types[request_type]
+		required_keys = sorted( key for key, field in request_fields.iteritems() if field[3] )
+		other_keys = sorted( key for key, field in request_fields.iteritems() if not field[3] )
+		return self._render( call_name, key_map, types, enums, request_type, required_keys, other_keys )
+
+	def write( self, call_name, directory ):
+		'''
+		Generate the module of call_name and write it to directory, returns its path
+		'''
+		path = os.path.join( directory, '%s%s.py' % (call_name.lower(), self.version) )
+		fp = open( path, 'w' )
+		try:
+			fp.write( self.generate( call_name ) )
+		finally:
+			fp.close()
+		return path
+
+	def _render( self, call_name, key_map, types, enums, request_type, required_keys, other_keys ):
+		lines = [
+			license_header,
+			'#Generated by ebay.trading.generate from the %s schema version %s - do not edit' % (self.schema_name, self.version),
+			'',
+			'from ebay.trading.__trading import *',
+			'from ebay.trading.schema import *',
+			'',
+			'ENUMS = {',
+		]
+		for name in sorted( enums ):
+			lines.append( '\t%r: frozenset(%r),' % (name, tuple( enums[name] )) )
+		lines.append( '}' )
+		lines.append( '' )
+		lines.append( 'TYPES = {' )
+		for type_name in sorted( types ):
+			lines.append( '\t%r: {' % type_name )
+			for key in sorted( types[type_name] ):
+				kind, name, repeated, required = types[type_name][key]
+				lines.append( '\t\t%r: (%s, %r, %r, %r),' % (key, kind_names[kind], name, repeated, required) )
+			lines.append( '\t},' )
+		lines.append( '}' )
+		lines.append( '' )
+		lines.append( '' )
+		lines.append( 'class %sRequest(TradingApiRequest):' % call_name )
+		lines.append( "\t'''" )
+		lines.append( '\tEbay Trading API %s Request' % call_name )
+		lines.append( '\t' )
+		lines.append( '\tGenerated from the %s schema version %s. The top-level keys are the' % (self.schema_name, self.version) )
+		lines.append( '\tfields of %s, and every key is validated against the schema.' % request_type )
+		lines.append( "\t'''" )
+		lines.append( '\t' )
+		lines.append( '\trequired_keys = %r' % (tuple( required_keys ),) )
+		lines.append( '\tother_keys = %r' % (tuple( other_keys ),) )
+		lines.append( '\thas_item_container = ()#The data mirrors the schema, the <Item> container is one of its keys' )
+		lines.append( '\tfields = TYPES[%r]' % request_type )
+		lines.append( '\t' )
+		lines.append( '\tkey_map = dict(TradingApiRequest.key_map)' )
+		lines.append( '\tkey_map.update({' )
+		for key in sorted( key_map ):
+			lines.append( '\t\t%r: %r,' % (key, key_map[key]) )
+		lines.append( '\t})' )
+		lines.append( '' )
+		lines.append( '\tdef __init__( self, *args ):' )
+		lines.append( "\t\tself.call_name = %r" % call_name )
+		lines.append( "\t\tself.request_name = '%sRequest'" % call_name )
+		lines.append( "\t\tself.api_version = %r" % self.version )
+		lines.append( '\t\tTradingApiRequest.__init__(self, *args )' )
+		lines.append( '\t\tself.help_string = """' )
+		lines.append( '%s' )
+		lines.append( 'Required Keys: %s' )
+		lines.append( 'Other Acceptable Keys: %s' )
+		lines.append( '\t""" % (self.request_name, self.required_keys, self.other_keys )' )
+		for key in required_keys + other_keys:
+			lines.append( '' )
+			lines.append( '\tdef _validate_%s( self, value ):' % key )
+			lines.append( '\t\tcheck_field( value, self.fields[%r], TYPES, ENUMS, %r )' % (key, key) )
+		lines.append( '' )
+		return '\n'.join( lines )
+
+
+license_header = '''#    This module is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.#
+#
+#    This module is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+class GeneratorError( Exception ): pass
+
+
+def main( argv ):
+	if len( argv ) < 5:
+		print "Usage: python -m ebay.trading.generate <schema.xsd> <version> <output directory> <CallName> [<CallName>...]"
+		return 1
+	path, version, directory = argv[1:4]
+	generator = RequestGenerator( SchemaReader( path ), version )
+	for call_name in argv[4:]:
+		print "Wrote %s" % generator.write( call_name, directory )
+	return 0
+
+if __name__ == '__main__':
+	sys.exit( main( sys.argv ) )
@@ -71,6 +71,8 @@ class ReviseItemRequest( TradingApiRequest ):
 						"Item.SKU",
 						"Item.SubTitle")#A list of all accepted deleted fields
 	
+	whole_containers = ('shipping_details', 'return_policy', 'item_specifics')#Containers eBay replaces as a whole, see from_diff()
+	
 	def __init__( self, *args ):
 		self.call_name = 'ReviseItem'
 		self.request_name = 'ReviseItemRequest'
@@ -91,6 +93,72 @@ Basic structure:
 	}
 	""" % (self.request_name, self.required_keys, self.other_keys )
 	
+	@classmethod
+	def from_diff( cls, item_id, previous, desired, *args ):
+		'''
+		Create the smallest request that revises a listing from its last-known
+		data to the desired data. Both are AddItem style data, the top-level
+		keys being the fields of the <Item> container.
+		
+		Only the changed fields are sent. Nested dicts are compared key by key,
+		except the whole_containers which are sent whole when anything in them
+		changed, and lists which are always sent whole. Fields that were removed
+		from the data are sent as DeletedFields.
+		
+		Args:
+			item_id[str]: The ItemID of the listing
+			previous[dict]: The last-known data of the listing
+			desired[dict]: The data the listing should have
+			*args: Passed on to ReviseItemRequest()
+			
+		Returns:
+			A ReviseItemRequest, or None if nothing changed and the call can be skipped
+			
+		Raises:
+			InvalidDeletedField: A removed field can't be deleted through ReviseItem
+		'''
+		changed = {}
+		deleted = []
+		cls._diff( previous, desired, changed, deleted, 'Item', True )
+		if not changed and not deleted:
+			return None
+		
+		unacceptable = [field for field in deleted if field not in cls.deleted_fields]
+		if unacceptable:
+			raise InvalidDeletedField( "These removed fields can't be deleted with ReviseItem: %s" % unacceptable )
+		
+		changed['item_id'] = item_id
+		data = {'item': changed}
+		if deleted:
+			data['deleted_field'] = deleted
+		request = cls( *args )
+		request.update( data )
+		return request
+	
+	@classmethod
+	def _diff( cls, previous, desired, changed, deleted, path, top_level=False ):
+		'''
+		Collect the changed values of desired into changed, and the field paths
+		( Item.PictureDetails.GalleryURL) of the keys removed from previous into deleted
+		'''
+		key_map = cls.key_map
+		for key, value in desired.iteritems():
+			if value is None:
+				continue
+			old = previous.get( key )
+			if old is None:
+				changed[key] = value
+			elif isinstance( value, dict ) and isinstance( old, dict ) and not (top_level and key in cls.whole_containers):
+				sub = {}
+				cls._diff( old, value, sub, deleted, "%s.%s" % (path, key_map.get( key, key )) )
+				if sub:
+					changed[key] = sub
+			elif not same_value( old, value ):
+				changed[key] = value
+		for key, old in previous.iteritems():
+			if old is not None and desired.get( key ) is None:
+				deleted.append( "%s.%s" % (path, key_map.get( key, key )) )
+	
 
 	'''
 	_validate_[field] methods here
@@ -123,6 +191,31 @@ Basic structure:
 			raise InvalidFieldType( "'deleted_fields' must be either a single str or a list of str" )
 		
 
+def same_value( old, new ):
+	'''
+	Compare two values the way they end up in the xml, so 75 and '75' are the same
+	'''
+	if isinstance( old, (dict, list) ) or isinstance( new, (dict, list) ) or old.__class__ is new.__class__:
+		return old == new
+	if not isinstance( old, basestring ) and not isinstance( new, basestring ):
+		return old == new#Numbers, 75 and 75.0 are the same
+	old, new = as_text( old ), as_text( new )
+	if old is None or new is None:
+		return False#A str that isn't UTF-8, and not equal to the other value
+	return old == new
+
+def as_text( value ):
+	'''
+	Returns value as unicode, str values are decoded as UTF-8( None if they aren't UTF-8)
+	'''
+	if isinstance( value, str ):
+		try:
+			return value.decode( 'utf-8' )
+		except UnicodeDecodeError:
+			return None
+	return unicode( value )
+	
+
 class InvalidDeletedField( Exception ): pass
 class InvalidFieldType( Exception ): pass	
 class MissingFieldError( Exception ): pass
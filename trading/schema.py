@@ -0,0 +1,118 @@
+#    This module is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.#
+#
+#    This module is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Wesley Hansen"
+__email__ = "wes@ridersdiscount.com"
+__date__ = "06/15/2012 11:38:39 AM"
+'''
+Validates request data against the type tables written by ebay.trading.generate
+
+A type table maps the name of each complex type of the schema to its fields:
+	{
+		'ItemType': {
+			'title': (STRING, None, False, False),
+			'listing_type': (ENUM, 'ListingTypeCodeType', False, False),
+			'payment_methods': (ENUM, 'BuyerPaymentMethodCodeType', True, False),
+			'primary_category': (COMPLEX, 'CategoryType', False, False),
+			...
+		},
+	}
+Each field is a tuple (kind, type name, repeated, required). The type name
+of an ENUM field is a key of the enum table, which maps it to a frozenset of
+the acceptable values.
+'''
+
+import re
+from ebay.trading.__trading import UnacceptableKeysError
+
+STRING = 's'
+INTEGER = 'i'
+DOUBLE = 'd'
+BOOLEAN = 'b'
+DATETIME = 't'
+ENUM = 'e'
+COMPLEX = 'c'
+ANY = 'a'
+
+datetime_pattern = re.compile( r'^\d{4}-\d{2}-\d{2}(T\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:\d{2})?)?$' )
+boolean_strings = frozenset( ('true', 'false', 'True', 'False', '1', '0') )
+
+
+def check_fields( value, fields, types, enums, path ):
+	'''
+	Validate a dict against the fields of a complex type
+
+	Args:
+		value[dict]: The data to validate
+		fields[dict]: The fields of the complex type, from the type table
+		types[dict]: The type table
+		enums[dict]: The enum table
+		path[str]: The dotted key of value, used in error messages
+	'''
+	if not isinstance( value, dict ):
+		raise InvalidFieldType( "'%s' must be a dict" % path )
+	for key, child in value.iteritems():
+		field = fields.get( key )
+		if field is None:
+			raise UnacceptableKeysError( "'%s' is not an acceptable key for '%s'" % (key, path) )
+		check_field( child, field, types, enums, "%s.%s" % (path, key) )
+	for key, field in fields.iteritems():
+		if field[3] and key not in value:
+			raise MissingRequiredKeys( "'%s' is missing the required key '%s'" % (path, key) )
+
+def check_field( value, field, types, enums, path ):
+	'''
+	Validate the value of a single field, see check_fields()
+	'''
+	kind, type_name, repeated, required = field
+	if isinstance( value, list ):
+		if not repeated:
+			raise InvalidFieldType( "'%s' can only have one value" % path )
+		for item in value:
+			check_value( item, kind, type_name, types, enums, path )
+	else:
+		check_value( value, kind, type_name, types, enums, path )
+
+def check_value( value, kind, type_name, types, enums, path ):
+	if kind == COMPLEX:
+		check_fields( value, types[type_name], types, enums, path )
+	elif kind == ENUM:
+		if value not in enums[type_name]:
+			raise InvalidFieldValue( "'%s' must be one of: %s" % (path, sorted( enums[type_name] )) )
+	elif kind == STRING:
+		if not isinstance( value, basestring ):
+			raise InvalidFieldType( "'%s' must be an instance of basestring" % path )
+	elif kind == INTEGER:
+		if isinstance( value, bool ) or not isinstance( value, (int, long, basestring) ):
+			raise InvalidFieldType( "'%s' must be an integer" % path )
+		if isinstance( value, basestring ) and not value.strip().lstrip( '-' ).isdigit():
+			raise InvalidFieldValue( "'%s' must be an integer, not %r" % (path, value) )
+	elif kind == DOUBLE:
+		if isinstance( value, bool ) or not isinstance( value, (int, long, float, basestring) ):
+			raise InvalidFieldType( "'%s' must be a number" % path )
+		if isinstance( value, basestring ):
+			try:
+				float( value )
+			except ValueError:
+				raise InvalidFieldValue( "'%s' must be a number, not %r" % (path, value) )
+	elif kind == BOOLEAN:
+		if not isinstance( value, bool ) and value not in boolean_strings:
+			raise InvalidFieldValue( "'%s' must be a boolean, not %r" % (path, value) )
+	elif kind == DATETIME:
+		if not isinstance( value, basestring ) or not datetime_pattern.match( value ):
+			raise InvalidFieldValue( "'%s' must be an ISO 8601 date/time string, not %r" % (path, value) )
+
+
+class InvalidFieldType( Exception ): pass
+class InvalidFieldValue( Exception ): pass
+class MissingRequiredKeys( Exception ): pass